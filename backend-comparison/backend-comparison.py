@@ -0,0 +1,125 @@
+from locust import User, task, events
+from locust.runners import MasterRunner
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redis_locust import WorkloadEngine, DynamoDbBackend, connect_redis, connect_dynamodb, \
+    connect_replicas, with_replicas, add_replica_arguments, \
+    add_workload_arguments, add_redis_arguments, add_dynamodb_arguments, \
+    start_sample_recorder, add_sample_arguments, enable_adaptive_pipelines, register_pipeline_stats, add_pipeline_arguments, \
+    start_hotkey_tracker, register_hotkey_report, add_hotkey_arguments, redis_backend, start_node_stats, register_cluster_report, \
+    WarmUp, register_warmup_report, add_warmup_arguments, start_workload_profile, reset_user_numbers, add_profile_arguments, \
+    start_metrics_exporter, add_metrics_arguments, register_region, add_region_arguments, \
+    enable_fault_isolation, start_fault_stats, register_fault_report, add_fault_arguments
+
+global myTargets
+
+@events.init_command_line_parser.add_listener
+def _(parser):
+    add_workload_arguments(parser)
+    add_sample_arguments(parser)
+    add_pipeline_arguments(parser)
+    add_hotkey_arguments(parser)
+    add_warmup_arguments(parser)
+    add_profile_arguments(parser)
+    add_metrics_arguments(parser)
+    add_region_arguments(parser)
+    add_fault_arguments(parser)
+    add_redis_arguments(parser)
+    add_replica_arguments(parser)
+    add_dynamodb_arguments(parser)
+    parser.add_argument("--backends", type=str, env_var="RED_LOCUST_BACKENDS", default="redis,dynamodb", help="Comma separated backends to run the same stream against [redis|dynamodb]")
+    parser.add_argument("--version_display", type=str, env_var="RED_VERSION_DISPLAY", default="0.3", help="Just used to show locust file version in UI")
+
+class ComparisonUser(User):
+    """
+    Locust user class that defines tasks and weights for test runs.
+    Every operation is executed against each configured backend in turn.
+    """
+
+    global myTargets
+
+    def on_start(self):
+        self.myEngine = WorkloadEngine(self.environment)
+        self.myEngine.seed_tasks(self)
+
+    @task(1)
+    def add(self):
+        self.myEngine.run("add", myTargets)
+
+    @task(1)
+    def add_batch(self):
+        self.myEngine.run("add_batch", myTargets)
+
+    @task(1)
+    def count(self):
+        self.myEngine.run("count", myTargets)
+
+    @task(1)
+    def count_batch(self):
+        self.myEngine.run("count_batch", myTargets)
+
+@events.init.add_listener
+def on_locust_init(environment, **kwargs):
+    """
+    Function to register listeners and web routes that have to exist before the test starts
+    """
+    register_pipeline_stats(environment)
+    register_hotkey_report(environment)
+    register_warmup_report(environment)
+    register_fault_report(environment)
+    start_metrics_exporter(environment)
+    register_region(environment)
+    register_cluster_report(environment)
+
+@events.test_start.add_listener
+def _(environment, **kw):
+    """
+    Function tagged in locust just to log some information on start-up
+    """
+    logging.info("Locust parameters for test run")
+    logging.info((vars(environment.parsed_options)))
+
+@events.test_start.add_listener
+def on_test_start(environment, **kwargs):
+    """
+    Function to initialize backend connections on startup of locust workers.
+    """
+    global myTargets
+
+    if isinstance(environment.runner, MasterRunner):
+        logging.info("Locust master node test start")
+    else:
+        logging.info("Locust worker or stand-alone node test start")
+        reset_user_numbers()
+        start_workload_profile(environment)
+        options = environment.parsed_options
+        start_sample_recorder(environment)
+        start_hotkey_tracker(environment)
+        start_fault_stats(environment)
+        start_node_stats(environment)
+        myWarmUp = WarmUp(environment)
+        myConnectors = {}
+        for backend in options.backends.split(','):
+            if (backend == "redis"):
+                myConnectors[backend] = lambda: connect_redis(options, options.redis_host, options.redis_port, options.username, options.password)
+                if (options.read_from_replicas == "Y"):
+                    myConnectors["redis-replica"] = lambda: connect_replicas(options, options.redis_host, options.redis_port, options.username, options.password, options.replica_endpoints)
+            elif (backend == "dynamodb"):
+                myConnectors[backend] = lambda: connect_dynamodb(options)
+            else:
+                raise ValueError("Unknown backend: %s" % backend)
+        myClients = myWarmUp.connect(myConnectors)
+        myTargets = []
+        for backend in options.backends.split(','):
+            if (backend == "redis"):
+                myTarget = redis_backend(options, myClients[backend], "redis-cluster" if options.cluster == "Y" else "redis")
+                myTargets.append(with_replicas(options, myTarget, myClients.get("redis-replica")))
+            else:
+                myTargets.append(DynamoDbBackend(myClients[backend], options.table_name, options.zrem_seconds))
+        enable_adaptive_pipelines(options, myTargets)
+        enable_fault_isolation(options, myTargets)
+        myWarmUp.run(myTargets)
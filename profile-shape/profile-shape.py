@@ -0,0 +1,12 @@
+"""
+Load shape running the user counts of the phases of --workload_profile.  Add it after the locustfile under test, which
+registers the profile options, eg
+locust -f sorted-sets-aa-vs-sa/sorted-sets-aa-vs-sa.py,profile-shape/profile-shape.py --workload_profile profile-shape/example-profile.yaml
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redis_locust import ProfileShape
@@ -0,0 +1,27 @@
+"""
+Shared workload engine and backends for the locustfiles in this repository.
+
+Locustfiles live in their own subdirectories, so they add the repository root to sys.path before importing this package.
+"""
+
+# Imported first so gevent monkey patches ssl and sockets before boto3 and redis are loaded
+import locust
+
+from redis_locust.backends import Backend, RedisBackend, RedisClusterBackend, ReplicaReadBackend, DynamoDbBackend, StaleReadError, \
+    connect_redis, connect_replicas, connect_dynamodb, redis_backend, with_replicas
+from redis_locust.cluster import NodeStats, start_node_stats, register_cluster_report
+from redis_locust.faults import CircuitBreaker, RetryPolicy, CircuitOpenError, classify_error, enable_fault_isolation, \
+    start_fault_stats, register_fault_report
+from redis_locust.engine import WorkloadEngine, Operation, OperationItem, OPERATION_KINDS, reset_user_numbers
+from redis_locust.hotkeys import CountMinSketch, HotKeyTracker, start_hotkey_tracker, register_hotkey_report
+from redis_locust.metrics import MetricsExporter, start_metrics_exporter, watch_client
+from redis_locust.options import add_workload_arguments, add_redis_arguments, add_replica_arguments, add_dynamodb_arguments, add_sample_arguments, \
+    add_pipeline_arguments, add_saturation_arguments, add_hotkey_arguments, add_warmup_arguments, add_profile_arguments, \
+    add_metrics_arguments, add_region_arguments, add_fault_arguments
+from redis_locust.pipeline import PipelineController, enable_adaptive_pipelines, register_pipeline_stats, pipeline_size_summary
+from redis_locust.profiles import WorkloadProfile, ProfileShape, load_profile, start_workload_profile
+from redis_locust.regions import Coordinator, Follower, register_region, region_time
+from redis_locust.saturation import SaturationShape
+from redis_locust.samples import SampleRecorder, start_sample_recorder
+from redis_locust.stats import record_request_meta
+from redis_locust.warmup import WarmUp, register_warmup_report, warmup_summary
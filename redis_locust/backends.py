@@ -0,0 +1,537 @@
+"""
+Backends the workload engine can run against.  A backend wraps one client connection and records every call it makes
+to locust under its own request_type, so several backends can be driven from the same operation stream.
+"""
+
+from boto3.dynamodb.conditions import Key
+from decimal import Decimal
+import botocore
+import boto3
+import gevent
+import logging
+import time
+import redis
+import redis.backoff
+import redis.retry
+
+from redis_locust.cluster import RedirectCountingConnection, RedirectCountingSSLConnection, slot_ranges, redirect_count
+from redis_locust.faults import CircuitOpenError, count_retry
+from redis_locust.metrics import watch_client
+from redis_locust.regions import region_time
+from redis_locust.stats import record_request_meta, is_recording
+
+def call_concurrently(count, function, *args, **kwargs):
+    """
+    Function to make count concurrent calls of function and return their results, a call that failed returning its
+    exception.  Failures are caught inside the greenlets, so gevent does not print a traceback for each of them.
+    """
+
+    def call():
+        try:
+            return(function(*args, **kwargs))
+        except Exception as e:
+            return(e)
+
+    greenlets = [gevent.spawn(call) for i in range(count)]
+    gevent.joinall(greenlets)
+
+    return([greenlet.value for greenlet in greenlets])
+
+class Backend():
+    """
+    Base class for a workload target.  Subclasses implement add and count (and trim where the store needs an
+    explicit trim of the sliding window) for both single and batch operations, sending batches in chunks of the size
+    chosen by the backend's pipeline controllers.
+    """
+
+    def __init__(self, request_type, reads=True):
+        self.request_type = request_type
+        self.reads = reads
+        self.pipeline_controllers = {}
+        self.breaker = None
+        self.retry = None
+
+    def parts(self):
+        """
+        Function returning the backends that make the calls of this backend
+        """
+
+        return([self])
+
+    def chunks(self, operation):
+        """
+        Function to split a batch operation into the pipelines / batches this backend sends
+        """
+
+        controller = self.pipeline_controllers.get(operation.kind)
+        if controller is None:
+            return([operation])
+
+        return(operation.split(controller.size))
+
+    def request_context(self, operation):
+        """
+        Function returning the context attached to the locust request events of a call made for an operation
+        """
+
+        return(operation.request_context)
+
+    def timed_call(self, operation, name, function, *args, **kwargs):
+        """
+        Function to time a single call made for an operation and record it to locust.  While the backend's circuit
+        breaker is open the call is not made and is recorded as circuit_open.  With a retry policy a failed call is
+        made again after a backoff, every attempt being recorded on its own.  A function with a prepare_retry method,
+        such as a PipelineCall, is prepared for the next attempt during the backoff, outside the timed call.
+        """
+
+        attempt = 0
+        while True:
+            ticket = None
+            if self.breaker is not None:
+                ticket = self.breaker.allow()
+                if ticket is None:
+                    self.refuse(name)
+                    return(None)
+
+            myResponse = None
+            myException = None
+            trans_start_time = time.perf_counter()
+            try:
+                myResponse = function(*args, **kwargs)
+            except Exception as e:
+                myException = e
+
+            record_request_meta(
+                request_type = self.request_type,
+                name = name,
+                start_time = trans_start_time,
+                end_time = time.perf_counter(),
+                response_length = 0,
+                response = myResponse,
+                exception = myException,
+                context = self.request_context(operation))
+
+            controller = self.pipeline_controllers.get(operation.kind)
+            if (controller is not None) and is_recording():
+                controller.observe(len(operation.items), time.perf_counter() - trans_start_time, myException is not None)
+            if (self.breaker is not None) and is_recording():
+                self.breaker.observe(ticket, myException)
+
+            if (myException is None) or (self.retry is None) or not self.retry.retries(attempt, myException):
+                return(myResponse)
+            if is_recording():
+                count_retry(self.request_type, myException)
+            backoff_end = time.perf_counter() + self.retry.backoff(attempt)
+            if hasattr(function, "prepare_retry"):
+                function.prepare_retry()
+            gevent.sleep(max(0, backoff_end - time.perf_counter()))
+            attempt += 1
+
+    def refuse(self, name):
+        """
+        Function to record a call refused by the circuit breaker, under its own name so its near zero response time
+        stays out of the latencies of the calls that were made
+        """
+
+        trans_start_time = time.perf_counter()
+        record_request_meta(
+            request_type = self.request_type,
+            name = "circuit_open",
+            start_time = trans_start_time,
+            end_time = trans_start_time,
+            response_length = 0,
+            response = None,
+            exception = CircuitOpenError("Circuit of %s open, %s not sent" % (self.request_type, name)),
+            context = {"batch_size": 0})
+
+    def connection_pools(self):
+        """
+        Function returning the redis connection pools of the backend's clients
+        """
+
+        return([])
+
+    def prefill(self, connections):
+        """
+        Function to open the given number of connections to the store ahead of the test, where the client pools them
+        """
+
+        pass
+
+    def add(self, operation):
+        raise NotImplementedError()
+
+    def trim(self, operation):
+        pass
+
+    def count(self, operation):
+        raise NotImplementedError()
+
+class PipelineCall():
+    """
+    Non-transactional pipeline of commands, a list of (command, args), built when created so the timed call only
+    executes it.  Executing a pipeline empties it, so it is built again only when the call is retried.
+    """
+
+    def __init__(self, client, commands):
+        self.client = client
+        self.commands = commands
+        self.prepare_retry()
+
+    def prepare_retry(self):
+        self.pipeline = self.client.pipeline(transaction=False)
+        for command, args in self.commands:
+            getattr(self.pipeline, command)(*args)
+
+    def __call__(self):
+        return(self.pipeline.execute())
+
+class RedisBackend(Backend):
+    """
+    Backend storing each key as a sorted set scored by transaction time.  Works with both redis.Redis and
+    redis.cluster.RedisCluster clients; batches are sent as non-transactional pipelines.
+    """
+
+    def __init__(self, client, request_type, reads=True):
+        super().__init__(request_type, reads)
+        self.client = client
+
+    def connection_pools(self):
+        """
+        Function returning the connection pools of the client, one per node known to a cluster client
+        """
+
+        if isinstance(self.client, redis.cluster.RedisCluster):
+            return([node.redis_connection.connection_pool for node in self.client.get_nodes() if node.redis_connection is not None])
+
+        return([self.client.connection_pool])
+
+    def prefill(self, connections):
+        for pool in self.connection_pools():
+            myConnections = call_concurrently(connections, pool.get_connection)
+            for connection in myConnections:
+                if not isinstance(connection, Exception):
+                    pool.release(connection)
+            for connection in myConnections:
+                if isinstance(connection, Exception):
+                    raise connection
+
+    def add(self, operation):
+        if operation.batch:
+            for chunk in self.chunks(operation):
+                self.timed_call(chunk, "zadd_pipe", PipelineCall(self.client, [("zadd", (item.key_name, item.members)) for item in chunk.items]))
+        else:
+            item = operation.items[0]
+            self.timed_call(operation, "zadd_jumbo" if operation.jumbo else "zadd", self.client.zadd, item.key_name, item.members)
+
+    def trim(self, operation):
+        if operation.batch:
+            for chunk in self.chunks(operation):
+                self.timed_call(chunk, "zrem_pipe", PipelineCall(self.client, [("zremrangebyscore", (item.key_name, 0, operation.trim_before)) for item in chunk.items]))
+        else:
+            self.timed_call(operation, "zrem", self.client.zremrangebyscore, operation.items[0].key_name, 0, operation.trim_before)
+
+    def count(self, operation):
+        if operation.batch:
+            for chunk in self.chunks(operation):
+                self.timed_call(chunk, "zcount_pipe", PipelineCall(self.client, [("zcount", (item.key_name, operation.window_start, operation.transtime)) for item in chunk.items]))
+        else:
+            return(self.timed_call(operation, "zcount", self.client.zcount, operation.items[0].key_name, operation.window_start, operation.transtime))
+
+class RedisClusterBackend(RedisBackend):
+    """
+    RedisBackend for a redis.cluster.RedisCluster client that attributes every call to the node it is sent to.
+    Pipeline chunks are split into one pipeline per node, and requests carry the node and its slot ranges in their
+    context for the per node statistics.
+    """
+
+    def __init__(self, client, request_type, reads=True):
+        super().__init__(client, request_type, reads)
+        self.ranges = {}
+        self.ranges_version = None
+
+    def node_of(self, key_name):
+        return(self.client.get_node_from_key(key_name).name)
+
+    def node_slots(self, node):
+        """
+        Function returning the slot ranges of a node, rebuilt when the slot map was refreshed or patched by a redirection
+        """
+
+        slots_cache = self.client.nodes_manager.slots_cache
+        version = (id(slots_cache), redirect_count())
+        if version != self.ranges_version:
+            self.ranges = slot_ranges(slots_cache)
+            self.ranges_version = version
+
+        return(self.ranges.get(node, ""))
+
+    def chunks(self, operation):
+        return([node_chunk for chunk in super().chunks(operation) for node_chunk in chunk.partition(lambda item: self.node_of(item.key_name))])
+
+    def request_context(self, operation):
+        node = self.node_of(operation.items[0].key_name)
+        return(dict(operation.request_context, node=node, slots=self.node_slots(node)))
+
+class StaleReadError(Exception):
+    pass
+
+class ReplicaReadBackend(Backend):
+    """
+    Target whose writes go to its primary backend and whose reads go to backends for its replicas, in turn.  Replica
+    backends record under their own request_type, so primary and replica reads are split in the stats.  Every
+    check_every-th single key read is repeated on the primary and recorded as zcount_staleness, failing when the
+    replica count differs from the primary count.  Writes landing between the two reads also count as a difference.
+    """
+
+    def __init__(self, primary, replicas, check_every):
+        super().__init__(primary.request_type, primary.reads)
+        self.primary = primary
+        self.replicas = replicas
+        self.check_every = check_every
+        self.reads_made = 0
+        self.single_reads = 0
+
+        # Shared so controllers attached to the target also size the pipelines sent to replicas
+        self.pipeline_controllers = primary.pipeline_controllers
+        for replica in replicas:
+            replica.pipeline_controllers = primary.pipeline_controllers
+
+    def parts(self):
+        return([self.primary] + self.replicas)
+
+    def connection_pools(self):
+        return([pool for backend in self.parts() for pool in backend.connection_pools()])
+
+    def prefill(self, connections):
+        for backend in self.parts():
+            backend.prefill(connections)
+
+    def add(self, operation):
+        self.primary.add(operation)
+
+    def trim(self, operation):
+        self.primary.trim(operation)
+
+    def count(self, operation):
+        replica = self.replicas[self.reads_made % len(self.replicas)]
+        self.reads_made += 1
+        myResponse = replica.count(operation)
+        if operation.batch:
+            return
+        # Only single key reads are counted towards the checks, so the interval does not depend on the pipeline mix
+        self.single_reads += 1
+        if (myResponse is not None) and self.check_every and (self.single_reads % self.check_every == 0):
+            # The check reads the primary directly, so it is skipped while the primary's circuit breaker is not closed
+            if (self.primary.breaker is None) or (self.primary.breaker.state == "closed"):
+                self.check_staleness(replica, operation, myResponse)
+
+    def check_staleness(self, replica, operation, replica_count):
+        """
+        Function to compare the count read from a replica with the count of the same key and window on the primary
+        """
+
+        primary_count = None
+        myException = None
+        trans_start_time = time.perf_counter()
+        try:
+            primary_count = self.primary.client.zcount(operation.items[0].key_name, operation.window_start, operation.transtime)
+        except Exception as e:
+            myException = e
+        if (myException is None) and (replica_count != primary_count):
+            myException = StaleReadError("Replica count %s primary" % ("below" if replica_count < primary_count else "above"))
+
+        record_request_meta(
+            request_type = replica.request_type,
+            name = "zcount_staleness",
+            start_time = trans_start_time,
+            end_time = time.perf_counter(),
+            response_length = abs(replica_count - primary_count) if primary_count is not None else 0,
+            response = primary_count,
+            exception = myException)
+
+class DynamoDbBackend(Backend):
+    """
+    Backend storing each member as an item keyed by Id and EventDate.  The sliding window is trimmed by the table's
+    ExpirationDate TTL, so there is no explicit trim call.
+    """
+
+    def __init__(self, resource, table_name, zrem_seconds, request_type="dynamodb", reads=True):
+        super().__init__(request_type, reads)
+        self.table = resource.Table(table_name)
+        self.zrem_seconds = zrem_seconds
+
+    def prefill(self, connections):
+        """
+        Function to fill the HTTP connection pool with concurrent DescribeTable calls, bounded by max_pool_connections
+        """
+
+        for myResponse in call_concurrently(connections, self.table.meta.client.describe_table, TableName=self.table.name):
+            if isinstance(myResponse, Exception):
+                raise myResponse
+
+    def put_items(self, writer, operation):
+        """
+        Function to write every member of the operation as its own item.  EventDate is taken at write time as it is
+        the range key, and members written in the same instant would otherwise overwrite each other.
+        """
+
+        myResponse = None
+        for item in operation.items:
+            for transaction_id in item.members:
+                event_date = Decimal(region_time())
+                expiration_date = event_date + self.zrem_seconds
+                myResponse = writer.put_item(Item={"Id":item.key_name, "EventDate":event_date, "ExpirationDate":expiration_date, "TransactionId":transaction_id})
+
+        return(myResponse)
+
+    def batch_put_items(self, operation):
+        with self.table.batch_writer() as batch:
+            return(self.put_items(batch, operation))
+
+    def query_count(self, key_name, operation):
+        """
+        Function to count the items of a key inside the operation's window, following LastEvaluatedKey pages
+        """
+
+        record_count = 0
+        query = {
+            "Select": "COUNT",
+            "KeyConditionExpression": Key("Id").eq(key_name) & Key("EventDate").between(Decimal(operation.window_start), Decimal(operation.transtime)) }
+        while True:
+            myResponse = self.table.query(**query)
+            record_count += myResponse["Count"]
+            if not "LastEvaluatedKey" in myResponse:
+                break
+            query["ExclusiveStartKey"] = myResponse["LastEvaluatedKey"]
+
+        return(record_count)
+
+    def count_items(self, operation):
+        return(sum(self.query_count(item.key_name, operation) for item in operation.items))
+
+    def add(self, operation):
+        if operation.batch:
+            for chunk in self.chunks(operation):
+                self.timed_call(chunk, "add_batch", self.batch_put_items, chunk)
+        else:
+            self.timed_call(operation, "add_jumbo" if operation.jumbo else "add", self.put_items, self.table, operation)
+
+    def count(self, operation):
+        if operation.batch:
+            for chunk in self.chunks(operation):
+                self.timed_call(chunk, "count_batch", self.count_items, chunk)
+        else:
+            self.timed_call(operation, "count", self.count_items, operation)
+
+def connect_redis(options, host, port, username, password, **kwargs):
+    """
+    Function to create a Redis client for one endpoint, honouring the cluster, tls, timeout and retry options.
+    Extra keyword arguments are passed on to the client.  Its pool checkouts are timed when the metrics exporter runs.
+    """
+
+    myTls = (options.tls == "Y")
+    timeout = options.timeout / 1000
+    if (options.retry_attempts > 0) or (options.circuit_breaker == "Y"):
+        # The client retries failed commands itself by default, which would hide failures from retries and breakers
+        kwargs.setdefault("retry", redis.retry.Retry(redis.backoff.NoBackoff(), 0))
+    if (options.cluster == "Y"):
+        myConnection = {}
+        if (options.retry_attempts > 0) or (options.circuit_breaker == "Y"):
+            # The cluster client and its pipelines also retry connection errors and timeouts on their own, whatever retry says
+            myConnection["cluster_error_retry_attempts"] = 0
+        if (options.cluster_attribution == "Y"):
+            # ssl=True would replace connection_class with SSLConnection, so TLS is selected by the class instead
+            myConnection["connection_class"] = RedirectCountingSSLConnection if myTls else RedirectCountingConnection
+            myTls = False
+        myClient = redis.cluster.RedisCluster(
+            host=host,
+            port=port,
+            username=username,
+            password=password,
+            ssl=myTls,
+            socket_timeout=timeout,
+            socket_connect_timeout=timeout,
+            **myConnection,
+            **kwargs)
+    else:
+        myClient = redis.Redis(
+            host=host,
+            port=port,
+            username=username,
+            password=password,
+            ssl=myTls,
+            socket_timeout=timeout,
+            socket_connect_timeout=timeout,
+            **kwargs)
+    watch_client(myClient)
+
+    return(myClient)
+
+def redis_backend(options, client, request_type, reads=True):
+    """
+    Function to create the backend for a client from connect_redis, attributing calls to cluster nodes when
+    --cluster_attribution is set
+    """
+
+    if (options.cluster == "Y") and (options.cluster_attribution == "Y"):
+        return(RedisClusterBackend(client, request_type, reads))
+
+    return(RedisBackend(client, request_type, reads))
+
+def connect_replicas(options, host, port, username, password, endpoints):
+    """
+    Function to create the clients reads go to with --read_from_replicas.  In cluster mode this is one client for the
+    cluster at host:port that reads from replicas only, otherwise one client per host:port of the comma separated
+    endpoints.
+    """
+
+    if (options.cluster == "Y"):
+        return([connect_redis(options, host, port, username, password, load_balancing_strategy=redis.cluster.LoadBalancingStrategy.ROUND_ROBIN_REPLICAS)])
+
+    if not endpoints:
+        raise ValueError("Replica endpoints are needed to read from replicas without --cluster")
+
+    return([connect_redis(options, endpoint.rsplit(':', 1)[0], endpoint.rsplit(':', 1)[1], username, password) for endpoint in endpoints.split(',')])
+
+def with_replicas(options, backend, replica_clients):
+    """
+    Function to route the reads of a backend to its replicas, recorded as "<request_type>-replica".  Replica reads
+    are not attributed to cluster nodes, as the cluster client only picks the replica serving a read when it sends it.
+    Returns the backend unchanged when there are no replica clients.
+    """
+
+    if not replica_clients:
+        return(backend)
+
+    replicas = [RedisBackend(client, backend.request_type + "-replica") for client in replica_clients]
+    return(ReplicaReadBackend(backend, replicas, options.replica_check_every))
+
+def connect_dynamodb(options):
+    """
+    Function to create the DynamoDB resource and make sure the table exists
+    """
+
+    myConfig = botocore.client.Config(max_pool_connections=50)
+    if (options.retry_attempts > 0) or (options.circuit_breaker == "Y"):
+        # botocore retries throttles and timeouts itself by default, which would hide them from retries and breakers
+        timeout = options.timeout / 1000
+        myConfig = myConfig.merge(botocore.client.Config(retries={"max_attempts": 0, "mode": "standard"}, connect_timeout=timeout, read_timeout=timeout))
+
+    if (options.local_mode == "Y"):
+        myDynamoDb = boto3.resource('dynamodb', endpoint_url='http://localhost:8000', config=myConfig)
+    else:
+        myDynamoDb = boto3.resource('dynamodb', config=myConfig)
+
+    try:
+        myDynamoDb.create_table(TableName=options.table_name,
+            AttributeDefinitions=[{"AttributeName":"Id","AttributeType":"S"},{"AttributeName":"EventDate","AttributeType":"N"}],
+            KeySchema=[{"AttributeName":"Id","KeyType":"HASH"}, {"AttributeName":"EventDate", "KeyType":"RANGE"}],
+            ProvisionedThroughput={"ReadCapacityUnits":5, "WriteCapacityUnits":5})
+    except Exception as e:
+        if (getattr(e, "response", {}).get("Error", {}).get("Code") == "ResourceInUseException"):
+            logging.info("DynamoDB table %s already exists" % options.table_name)
+        else:
+            raise e
+
+    return(myDynamoDb)
@@ -0,0 +1,227 @@
+"""
+Per node attribution in cluster mode.  Requests of a RedisClusterBackend carry the node and slot ranges they were sent
+to, every worker keeps latency histograms and command counts per (request_type, node) plus the MOVED / ASK
+redirections seen by its connections, and the master merges them into a per node report with the imbalance between
+the nodes of each target.
+"""
+
+import json
+import logging
+import statistics
+import time
+import redis
+
+from redis_locust.stats import round_latency, merge_histograms, latency_summary
+
+# MOVED / ASK redirections received on this process, keyed by (node, kind)
+_redirects = {}
+
+# Node statistics of the current test on this process
+_node_stats = None
+
+# Node statistics received from workers, only populated on the process writing the report
+_received = []
+
+def count_redirect(connection, error):
+    kind = "moved" if isinstance(error, redis.exceptions.MovedError) else "ask"
+    key = ("%s:%s" % (connection.host, connection.port), kind)
+    _redirects[key] = _redirects.get(key, 0) + 1
+
+def redirect_count():
+    return(sum(_redirects.values()))
+
+class RedirectCountingConnection(redis.connection.Connection):
+    """
+    Connection counting the MOVED / ASK replies of the node it is connected to.  RedisCluster handles redirections
+    internally, so the connection is the only place they can be seen.
+    """
+
+    def read_response(self, *args, **kwargs):
+        try:
+            return(super().read_response(*args, **kwargs))
+        except (redis.exceptions.MovedError, redis.exceptions.AskError) as e:
+            count_redirect(self, e)
+            raise
+
+class RedirectCountingSSLConnection(redis.connection.SSLConnection):
+    """
+    TLS variant of RedirectCountingConnection
+    """
+
+    def read_response(self, *args, **kwargs):
+        try:
+            return(super().read_response(*args, **kwargs))
+        except (redis.exceptions.MovedError, redis.exceptions.AskError) as e:
+            count_redirect(self, e)
+            raise
+
+def slot_ranges(slots_cache):
+    """
+    Function returning the slot ranges served by each primary, eg {"10.0.0.1:6379": "0-5460,10923-10930"}
+    """
+
+    ranges = {}
+    for slot in sorted(slots_cache):
+        if not slots_cache[slot]:
+            continue
+        node = slots_cache[slot][0].name
+        node_ranges = ranges.setdefault(node, [])
+        if node_ranges and (node_ranges[-1][1] == slot - 1):
+            node_ranges[-1][1] = slot
+        else:
+            node_ranges.append([slot, slot])
+
+    return({node: ",".join(str(first) if first == last else "%d-%d" % (first, last) for first, last in node_ranges)
+        for node, node_ranges in ranges.items()})
+
+class NodeStats():
+    """
+    Per worker statistics of requests tagged with a node, taken from locust request events
+    """
+
+    def __init__(self, environment):
+        self.environment = environment
+        self.start = time.time()
+        self.nodes = {}
+        self.stopped = False
+
+    def on_request(self, request_type, name, response_time, context=None, exception=None, **kwargs):
+        """
+        Function listening to locust request events, recording requests sent by RedisClusterBackend
+        """
+
+        if (not context) or ("node" not in context):
+            return
+
+        stats = self.nodes.get((request_type, context["node"]))
+        if stats is None:
+            stats = {"slots": "", "requests": 0, "failures": 0, "commands": 0, "response_times": {}}
+            self.nodes[(request_type, context["node"])] = stats
+        stats["slots"] = context["slots"]
+        stats["requests"] += 1
+        stats["commands"] += context.get("batch_size", 1)
+        if exception is not None:
+            stats["failures"] += 1
+        latency = round_latency(response_time)
+        stats["response_times"][latency] = stats["response_times"].get(latency, 0) + 1
+
+    def payload(self):
+        """
+        Function returning the statistics in a form that can be sent to the master
+        """
+
+        return({
+            "seconds": time.time() - self.start,
+            "nodes": [[request_type, node, stats["slots"], stats["requests"], stats["failures"], stats["commands"], list(stats["response_times"].items())]
+                for (request_type, node), stats in self.nodes.items()],
+            "redirects": [[node, kind, count] for (node, kind), count in _redirects.items()] })
+
+    def on_test_stop(self, **kwargs):
+        global _node_stats
+
+        if self.stopped:
+            return
+        self.stopped = True
+        self.environment.events.request.remove_listener(self.on_request)
+        if _node_stats is self:
+            _node_stats = None
+        self.environment.runner.send_message("cluster_nodes", self.payload())
+
+def start_node_stats(environment):
+    """
+    Function to start per node statistics on a worker when --cluster and --cluster_attribution are set
+    """
+
+    global _node_stats
+
+    _redirects.clear()
+    options = environment.parsed_options
+    if (options.cluster != "Y") or (options.cluster_attribution != "Y"):
+        _node_stats = None
+        return(None)
+
+    _node_stats = NodeStats(environment)
+    environment.events.request.add_listener(_node_stats.on_request)
+    environment.events.test_stop.add_listener(_node_stats.on_test_stop)
+
+    return(_node_stats)
+
+def imbalance(nodes):
+    """
+    Function to describe how evenly the commands of one target were spread over its nodes
+    """
+
+    commands = [node["commands"] for node in nodes]
+    mean = statistics.mean(commands)
+    hottest = max(nodes, key=lambda node: node["commands"])
+    slowest = max(nodes, key=lambda node: node["p99_us"])
+
+    return({
+        "nodes": len(nodes),
+        "hottest_node": hottest["node"],
+        "max_to_mean_commands": round(hottest["commands"] / mean, 3) if mean else 0,
+        "commands_cv": round(statistics.pstdev(commands) / mean, 3) if mean else 0,
+        "slowest_node": slowest["node"],
+        "max_to_min_p99": round(slowest["p99_us"] / max(1, min(node["p99_us"] for node in nodes)), 3) })
+
+def node_report(payloads):
+    """
+    Function to merge the node statistics of all workers into the per node report
+    """
+
+    seconds = max(payload["seconds"] for payload in payloads)
+    merged = {}
+    for payload in payloads:
+        for request_type, node, slots, requests, failures, commands, response_times in payload["nodes"]:
+            entry = merged.setdefault((request_type, node), {"slots": slots, "failures": 0, "commands": 0, "histograms": []})
+            entry["failures"] += failures
+            entry["commands"] += commands
+            entry["histograms"].append(response_times)
+
+    targets = {}
+    for (request_type, node), entry in sorted(merged.items()):
+        summary = latency_summary(merge_histograms(entry["histograms"]))
+        summary.update({
+            "node": node,
+            "slots": entry["slots"],
+            "failures": entry["failures"],
+            "commands": entry["commands"],
+            "commands_per_second": round(entry["commands"] / seconds, 1) if seconds else 0 })
+        targets.setdefault(request_type, []).append(summary)
+
+    redirects = {}
+    for payload in payloads:
+        for node, kind, count in payload["redirects"]:
+            node_redirects = redirects.setdefault(node, {"moved": 0, "ask": 0})
+            node_redirects[kind] += count
+
+    return({
+        "workers": len(payloads),
+        "seconds": round(seconds, 1),
+        "targets": {request_type: {"imbalance": imbalance(nodes), "nodes": nodes} for request_type, nodes in targets.items()},
+        "redirects": redirects })
+
+def register_cluster_report(environment):
+    """
+    Function to collect the node statistics sent by workers and write the merged report each time one arrives, so the
+    report is complete once the last worker has stopped.  Call from an init listener.
+    """
+
+    def on_cluster_nodes(environment, msg, **kwargs):
+        _received.append(msg.data)
+        report = node_report(_received)
+        with open(environment.parsed_options.cluster_report, "w") as f:
+            json.dump(report, f, indent=2)
+        logging.info("Cluster node report from %d workers written to %s" % (len(_received), environment.parsed_options.cluster_report))
+        for request_type, target in sorted(report["targets"].items()):
+            logging.info("Cluster %s: hottest node %s has %.2fx the mean commands, slowest node %s" % (request_type,
+                target["imbalance"]["hottest_node"], target["imbalance"]["max_to_mean_commands"], target["imbalance"]["slowest_node"]))
+        for node, node_redirects in sorted(report["redirects"].items()):
+            logging.info("Cluster node %s redirected %d MOVED and %d ASK" % (node, node_redirects["moved"], node_redirects["ask"]))
+
+    def on_test_start(**kwargs):
+        del _received[:]
+
+    if environment.runner is not None:
+        environment.runner.register_message("cluster_nodes", on_cluster_nodes)
+    environment.events.test_start.add_listener(on_test_start)
@@ -0,0 +1,265 @@
+"""
+Workload engine producing the sliding-window operation stream shared by every backend.
+"""
+
+import collections
+import itertools
+import random
+import string
+import time
+import numpy
+
+from redis_locust.hotkeys import current_tracker
+from redis_locust.metrics import current_exporter
+from redis_locust.regions import region_time
+
+OPERATION_KINDS = ("add", "add_batch", "count", "count_batch")
+
+OperationItem = collections.namedtuple("OperationItem", ["rank", "key_name", "members"])
+
+# Numbers the users started on this process in the current test, their seeds derive from it
+_user_numbers = itertools.count()
+
+# Workload settings of the running profile phase, read before parsed_options, which locust updates on workers with the
+# master's options on every spawn message
+_profile_settings = {}
+
+def reset_user_numbers():
+    """
+    Function to number the users of a new test from 0 again, so each test on the process derives the same seeds.  Call
+    from the test start listener.
+    """
+
+    global _user_numbers
+    _user_numbers = itertools.count()
+
+def set_profile_settings(settings):
+    """
+    Function to replace the workload settings of the running profile phase, an empty dict goes back to the options
+    """
+
+    _profile_settings.clear()
+    _profile_settings.update(settings)
+
+class Operation():
+    """
+    A single unit of work produced by WorkloadEngine.  The same operation is replayed unchanged against every backend,
+    so all targets see identical keys, members and window boundaries.
+    """
+
+    def __init__(self, kind, transtime, items, window_start, trim_before):
+        self.kind = kind
+        self.transtime = transtime
+        self.items = items
+        self.window_start = window_start
+        self.trim_before = trim_before
+        self.jumbo = any(len(item.members) > 1 for item in items)
+
+        # Context attached to the locust request events of this operation, for batches key_rank is the hottest rank
+        self.request_context = {"batch_size": len(items), "key_rank": min(item.rank for item in items)}
+
+    def split(self, size):
+        """
+        Function to split the operation into consecutive operations of at most size items
+        """
+
+        if len(self.items) <= size:
+            return([self])
+
+        return([Operation(self.kind, self.transtime, self.items[i:i + size], self.window_start, self.trim_before)
+            for i in range(0, len(self.items), size)])
+
+    def partition(self, key_function):
+        """
+        Function to split the operation into one operation per value of key_function(item), keeping item order
+        """
+
+        groups = {}
+        for item in self.items:
+            groups.setdefault(key_function(item), []).append(item)
+        if len(groups) == 1:
+            return([self])
+
+        return([Operation(self.kind, self.transtime, items, self.window_start, self.trim_before) for items in groups.values()])
+
+    @property
+    def is_write(self):
+        return(self.kind in ("add", "add_batch"))
+
+    @property
+    def batch(self):
+        return(self.kind in ("add_batch", "count_batch"))
+
+class WorkloadEngine():
+    """
+    Generates operations (add, add_batch, count, count_batch) with zipf skewed keys and jumbo adds, and executes
+    them against a list of backends.  When --seed is set each user gets its own reproducible stream, derived from the
+    seed, the worker index and the order in which users were started on the worker in the test.  Users that pick their
+    tasks with seed_tasks also draw the order of operation kinds from the stream.  Warm-up engines are unseeded and
+    not counted by the hot key tracker, so they leave the streams of the measured users unchanged.
+    """
+
+    def __init__(self, environment, warmup=False):
+        self.environment = environment
+        self.options = environment.parsed_options
+        self.jumbo_size = None
+
+        if self.options.seed and not warmup:
+            worker_index = getattr(environment.runner, "worker_index", 0)
+            seed_sequence = numpy.random.SeedSequence([self.options.seed, worker_index, next(_user_numbers)])
+        else:
+            seed_sequence = numpy.random.SeedSequence()
+        self.numpy_random = numpy.random.default_rng(seed_sequence)
+        self.random = random.Random(int(seed_sequence.generate_state(1)[0]))
+        self.key_tracker = None if warmup else current_tracker()
+        self.metrics = None if warmup else current_exporter()
+
+    def seed_tasks(self, user):
+        """
+        Function to make the user pick its next task with the engine's random generator instead of locust's shared
+        one, from the same weighted tasks list.  Call from on_start, locust creates the user's task set before it.
+        """
+
+        user._taskset_instance.get_next_task = lambda: self.random.choice(user.tasks)
+
+    def setting(self, name):
+        """
+        Function to read a workload option, as set by the running profile phase when it sets it
+        """
+
+        return(_profile_settings.get(name, getattr(self.options, name)))
+
+    @property
+    def jumbo_sizes(self):
+        """
+        Extra members of jumbo adds, parsed again when --jumbo_size is changed by a workload profile
+        """
+
+        if self.jumbo_size != self.setting("jumbo_size"):
+            self.jumbo_size = self.setting("jumbo_size")
+            self.parsed_jumbo_sizes = [int(size) for size in self.jumbo_size.split(',')]
+
+        return(self.parsed_jumbo_sizes)
+
+    def get_key_rank(self):
+        """
+        Function to pick the zipf rank of the next key, bounded by --zipf_max_keys
+        """
+
+        x = self.options.zipf_max_keys + 1
+        while x > self.options.zipf_max_keys:
+            x = int(self.numpy_random.zipf(a=self.setting("zipf_shape")))
+
+        return(x)
+
+    def get_key_int(self, rank):
+        """
+        Function to map a zipf rank to the integer used for creation of key name(s)
+        Direction and offset controlled by locust params
+        """
+
+        return(self.options.zipf_offset + (rank * self.options.zipf_direction))
+
+    def get_key_name_from_int(self, key_int):
+        """
+        Function to generate a key name string from an integer
+        Implements zero filling based on locust parameter
+        """
+
+        return(''.join((self.options.key_name_prefix, str(key_int).zfill(self.options.key_name_length))))
+
+    def get_member(self, separator=''):
+        """
+        Function to generate a random member / transaction id
+        """
+
+        length = self.random.randint(self.options.value_min_chars, self.options.value_max_chars)
+        return(separator.join(self.random.choices(string.ascii_uppercase + string.digits, k=length)))
+
+    def is_jumbo(self, rank, key_int):
+        """
+        Function to decide whether an add to this key gets the extra jumbo members
+        """
+
+        return((rank > self.setting("jumbo_initial_exclude")) and (key_int % self.setting("jumbo_frequency") == 0))
+
+    def build_item(self, with_members):
+        """
+        Function to pick a key and, for writes, the members to add to it
+        """
+
+        rank = self.get_key_rank()
+        key_int = self.get_key_int(rank)
+        if self.key_tracker is not None:
+            self.key_tracker.count(rank)
+        members = {}
+        if with_members:
+            members[self.get_member()] = region_time()
+            if self.is_jumbo(rank, key_int):
+                for i in range(self.random.choice(self.jumbo_sizes)):
+                    members[self.get_member(str(i))] = region_time()
+
+        return(OperationItem(rank, self.get_key_name_from_int(key_int), members))
+
+    def get_batch_size(self, kind, backends):
+        """
+        Function to size a batch operation.  With adaptive pipelines the operation is as large as the largest size
+        chosen by the backends, each backend then splits it into its own pipeline size.
+        """
+
+        sizes = [backend.pipeline_controllers[kind].size for backend in backends if kind in backend.pipeline_controllers]
+        if sizes:
+            return(max(sizes))
+
+        return(self.setting("pipeline_size"))
+
+    def next_operation(self, kind, backends=()):
+        """
+        Function to build the next operation of the given kind from the stream
+        """
+
+        if kind not in OPERATION_KINDS:
+            raise ValueError("Unknown operation kind: %s" % kind)
+
+        transtime = region_time()
+        size = self.get_batch_size(kind, backends) if kind in ("add_batch", "count_batch") else 1
+        with_members = kind in ("add", "add_batch")
+        items = [self.build_item(with_members) for i in range(size)]
+
+        return(Operation(
+            kind = kind,
+            transtime = transtime,
+            items = items,
+            window_start = transtime - self.setting("zcount_seconds"),
+            trim_before = transtime - self.setting("zrem_seconds")))
+
+    def execute(self, operation, backends):
+        """
+        Function to run one operation against the backends, recording requests to locust.
+        Writes go to every backend (all adds first, then all trims), reads only go to backends that serve reads.
+        """
+
+        if operation.is_write:
+            for backend in backends:
+                backend.add(operation)
+            for backend in backends:
+                backend.trim(operation)
+        else:
+            for backend in backends:
+                if backend.reads:
+                    backend.count(operation)
+
+    def run(self, kind, backends):
+        """
+        Function to build the next operation of the given kind and execute it against the backends
+        """
+
+        if self.metrics is None:
+            self.execute(self.next_operation(kind, backends), backends)
+            return
+
+        # Building an operation never yields to other greenlets, so the process CPU time spent is all its own
+        generator_start = time.process_time()
+        operation = self.next_operation(kind, backends)
+        self.metrics.observe_generator(kind, time.process_time() - generator_start)
+        self.execute(operation, backends)
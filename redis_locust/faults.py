@@ -0,0 +1,310 @@
+"""
+Per target fault isolation.  Failed calls are classified into error classes (timeout, connection reset, MOVED, OOM,
+throttle, ...), each target can get a circuit breaker that stops sending calls to a failing endpoint for a while, and
+failed calls can be retried a bounded number of times with backoff.  Every worker counts errors, retries and breaker
+activity per target, and the master merges them into the faults report.
+"""
+
+import collections
+import json
+import logging
+import random
+import time
+import botocore.exceptions
+import redis
+
+# Error classes a failed call is retried on, the others fail the same way when retried
+RETRIABLE_ERRORS = ("timeout", "connection_reset", "connection", "throttle", "moved", "ask", "cluster_down")
+
+# Error codes DynamoDB returns when requests are throttled
+THROTTLE_CODES = ("ProvisionedThroughputExceededException", "ThrottlingException", "RequestLimitExceeded", "TooManyRequestsException")
+
+# Permission to make one call, from CircuitBreaker.allow, handed back to CircuitBreaker.observe with its outcome
+BreakerTicket = collections.namedtuple("BreakerTicket", ["generation", "probe"])
+
+# Circuit breakers of the current test on this process
+_breakers = []
+
+# Retries made in the current test on this process, keyed by (request_type, error class)
+_retries = {}
+
+# Fault statistics received from workers, only populated on the process writing the report
+_received = []
+
+class CircuitOpenError(Exception):
+    pass
+
+def classify_error(exception):
+    """
+    Function to map an exception to its error class, or to its type name when it is none of the known classes
+    """
+
+    if isinstance(exception, CircuitOpenError):
+        return("circuit_open")
+    if isinstance(exception, (redis.exceptions.TimeoutError, TimeoutError, botocore.exceptions.ReadTimeoutError, botocore.exceptions.ConnectTimeoutError)):
+        return("timeout")
+    if isinstance(exception, (ConnectionResetError, BrokenPipeError, botocore.exceptions.ConnectionClosedError)):
+        return("connection_reset")
+    if isinstance(exception, redis.exceptions.ConnectionError):
+        message = str(exception).lower()
+        if "max number of clients" in message:
+            return("throttle")
+        if ("reset by peer" in message) or ("closed by server" in message) or ("broken pipe" in message):
+            return("connection_reset")
+        return("connection")
+    if isinstance(exception, (ConnectionError, botocore.exceptions.EndpointConnectionError)):
+        return("connection")
+    if isinstance(exception, redis.exceptions.MovedError):
+        return("moved")
+    if isinstance(exception, redis.exceptions.AskError):
+        return("ask")
+    if isinstance(exception, (redis.exceptions.ClusterDownError, redis.exceptions.TryAgainError)):
+        return("cluster_down")
+    if isinstance(exception, redis.exceptions.OutOfMemoryError) or \
+        (isinstance(exception, redis.exceptions.ResponseError) and ("OOM" in str(exception))):
+        return("oom")
+    if isinstance(exception, botocore.exceptions.ClientError) and (exception.response.get("Error", {}).get("Code") in THROTTLE_CODES):
+        return("throttle")
+
+    return(type(exception).__name__)
+
+class CircuitBreaker():
+    """
+    Circuit breaker of one target.  Closed, it keeps the outcomes of the last --breaker_window calls and opens when
+    --breaker_timeouts calls in a row timed out, or when at least --breaker_min_calls calls were seen and
+    --breaker_error_rate of them failed.  Open, calls are refused for --breaker_open_seconds, after which it is
+    half-open and lets a single probe call through: the breaker closes when the probe succeeds and opens again when it
+    fails.  Every change of state starts a new generation, and only calls allowed in the current generation count, so
+    calls already running when the breaker opened do not count and the probe is the only call counted while half-open.
+    """
+
+    def __init__(self, request_type, window, min_calls, error_rate, timeouts, open_seconds):
+        self.request_type = request_type
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.timeouts = timeouts
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.outcomes = collections.deque(maxlen=window)
+        self.timeouts_in_row = 0
+        self.opened_at = None
+        self.probing = False
+        self.generation = 0
+        self.opened = 0
+        self.rejected = 0
+        self.seconds_open = 0.0
+
+    def allow(self):
+        """
+        Function deciding whether a call may be sent to the target.  Returns the ticket of the call, or None when the
+        call is refused, counting the calls refused.
+        """
+
+        if (self.state == "closed"):
+            return(BreakerTicket(self.generation, False))
+        if (self.state == "open") and (time.monotonic() - self.opened_at >= self.open_seconds):
+            self.state = "half_open"
+            self.generation += 1
+            self.probing = False
+        if (self.state == "half_open") and not self.probing:
+            self.probing = True
+            return(BreakerTicket(self.generation, True))
+
+        self.rejected += 1
+        return(None)
+
+    def observe(self, ticket, exception):
+        """
+        Function to record the outcome of the call allowed with ticket, exception is None when it succeeded
+        """
+
+        if ticket.generation != self.generation:
+            return
+        if ticket.probe:
+            self.probing = False
+            if exception is None:
+                self.close()
+            else:
+                self.trip("probe failed with %s" % classify_error(exception))
+            return
+
+        self.outcomes.append(exception is not None)
+        if (exception is not None) and (classify_error(exception) == "timeout"):
+            self.timeouts_in_row += 1
+        else:
+            self.timeouts_in_row = 0
+
+        if self.timeouts_in_row >= self.timeouts:
+            self.trip("%d timeouts in a row" % self.timeouts_in_row)
+        elif (len(self.outcomes) >= self.min_calls) and (sum(self.outcomes) >= self.error_rate * len(self.outcomes)):
+            self.trip("%d of the last %d calls failed" % (sum(self.outcomes), len(self.outcomes)))
+
+    def trip(self, reason):
+        if (self.state == "closed"):
+            self.opened_at = time.monotonic()
+            self.opened += 1
+            logging.warning("Circuit of %s opened, %s" % (self.request_type, reason))
+        else:
+            # A failed probe keeps the time spent open counting from when the breaker first opened
+            self.seconds_open += time.monotonic() - self.opened_at
+            self.opened_at = time.monotonic()
+        self.state = "open"
+        self.generation += 1
+        self.outcomes.clear()
+        self.timeouts_in_row = 0
+
+    def close(self):
+        self.seconds_open += time.monotonic() - self.opened_at
+        self.state = "closed"
+        self.generation += 1
+        logging.info("Circuit of %s closed, open for %.1f seconds in total" % (self.request_type, self.seconds_open))
+
+    def report(self):
+        seconds_open = self.seconds_open
+        if (self.state != "closed"):
+            seconds_open += time.monotonic() - self.opened_at
+
+        return({"state": self.state, "opened": self.opened, "rejected": self.rejected, "seconds_open": round(seconds_open, 3)})
+
+class RetryPolicy():
+    """
+    Bounded retry of calls that failed with a retriable error class, waiting an exponential backoff with full jitter
+    between attempts
+    """
+
+    def __init__(self, attempts, backoff_ms, backoff_max_ms):
+        self.attempts = attempts
+        self.backoff_ms = backoff_ms
+        self.backoff_max_ms = backoff_max_ms
+
+    def retries(self, attempt, exception):
+        """
+        Function deciding whether the call that failed on its attempt-th retry (0 for the first call) is sent again
+        """
+
+        return((attempt < self.attempts) and (classify_error(exception) in RETRIABLE_ERRORS))
+
+    def backoff(self, attempt):
+        return(random.uniform(0, min(self.backoff_max_ms, self.backoff_ms * (2 ** attempt))) / 1000)
+
+def count_retry(request_type, exception):
+    key = (request_type, classify_error(exception))
+    _retries[key] = _retries.get(key, 0) + 1
+
+def current_breakers():
+    """
+    Function returning the circuit breakers of the current test on this process
+    """
+
+    return(list(_breakers))
+
+def enable_fault_isolation(options, backends):
+    """
+    Function to attach a circuit breaker to every backend making calls when --circuit_breaker is set, and a retry
+    policy when --retry_attempts is above 0
+    """
+
+    del _breakers[:]
+    myRetry = RetryPolicy(options.retry_attempts, options.retry_backoff_ms, options.retry_backoff_max_ms) if options.retry_attempts > 0 else None
+    for target in backends:
+        for backend in target.parts():
+            backend.retry = myRetry
+            backend.breaker = None
+            if (options.circuit_breaker == "Y"):
+                backend.breaker = CircuitBreaker(backend.request_type, options.breaker_window, options.breaker_min_calls,
+                    options.breaker_error_rate, options.breaker_timeouts, options.breaker_open_seconds)
+                _breakers.append(backend.breaker)
+
+class FaultStats():
+    """
+    Per worker counts of failed requests by target and error class, taken from locust request events and sent to the
+    master with the retries and breaker activity at test stop
+    """
+
+    def __init__(self, environment):
+        self.environment = environment
+        self.errors = {}
+        self.stopped = False
+
+    def on_request(self, request_type, name, response_time, exception=None, **kwargs):
+        if exception is None:
+            return
+
+        key = (request_type, classify_error(exception))
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def payload(self):
+        return({
+            "errors": [[request_type, error, count] for (request_type, error), count in self.errors.items()],
+            "retries": [[request_type, error, count] for (request_type, error), count in _retries.items()],
+            "breakers": [[breaker.request_type, breaker.report()] for breaker in _breakers] })
+
+    def on_test_stop(self, **kwargs):
+        if self.stopped:
+            return
+        self.stopped = True
+        self.environment.events.request.remove_listener(self.on_request)
+        self.environment.runner.send_message("faults", self.payload())
+
+def start_fault_stats(environment):
+    """
+    Function to start counting the errors, retries and breaker activity of the test on a worker
+    """
+
+    _retries.clear()
+    myFaultStats = FaultStats(environment)
+    environment.events.request.add_listener(myFaultStats.on_request)
+    environment.events.test_stop.add_listener(myFaultStats.on_test_stop)
+
+    return(myFaultStats)
+
+def fault_report(payloads):
+    """
+    Function to merge the fault statistics of all workers per target
+    """
+
+    targets = {}
+
+    def target(request_type):
+        return(targets.setdefault(request_type, {"errors": {}, "retries": {}}))
+
+    for payload in payloads:
+        for request_type, error, count in payload["errors"]:
+            errors = target(request_type)["errors"]
+            errors[error] = errors.get(error, 0) + count
+        for request_type, error, count in payload["retries"]:
+            retries = target(request_type)["retries"]
+            retries[error] = retries.get(error, 0) + count
+        for request_type, report in payload["breakers"]:
+            breaker = target(request_type).setdefault("breaker", {"breakers": 0, "opened": 0, "rejected": 0, "seconds_open_max": 0, "open_at_stop": 0})
+            breaker["breakers"] += 1
+            breaker["opened"] += report["opened"]
+            breaker["rejected"] += report["rejected"]
+            breaker["seconds_open_max"] = max(breaker["seconds_open_max"], report["seconds_open"])
+            if (report["state"] != "closed"):
+                breaker["open_at_stop"] += 1
+
+    return({"workers": len(payloads), "targets": dict(sorted(targets.items()))})
+
+def register_fault_report(environment):
+    """
+    Function to collect the fault statistics sent by workers and write the merged report each time one arrives, so the
+    report is complete once the last worker has stopped.  Call from an init listener.
+    """
+
+    def on_faults(environment, msg, **kwargs):
+        _received.append(msg.data)
+        report = fault_report(_received)
+        with open(environment.parsed_options.faults_report, "w") as f:
+            json.dump(report, f, indent=2)
+        for request_type, target in report["targets"].items():
+            breaker = target.get("breaker", {"opened": 0, "rejected": 0})
+            logging.info("Faults of %s: errors %s, retries %s, circuit opened %d times and refused %d calls" % (request_type,
+                json.dumps(target["errors"], sort_keys=True), json.dumps(target["retries"], sort_keys=True), breaker["opened"], breaker["rejected"]))
+
+    def on_test_start(**kwargs):
+        del _received[:]
+
+    if environment.runner is not None:
+        environment.runner.register_message("faults", on_faults)
+    environment.events.test_start.add_listener(on_test_start)
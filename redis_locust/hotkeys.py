@@ -0,0 +1,239 @@
+"""
+Hot key tracking.  Every worker counts the zipf rank of each key it touches in a count-min sketch, keeps the top-K
+ranks with a latency histogram per request_type, and sends both to the master at test stop, where they are merged
+into a report of the hottest keys, their share of traffic and their latency percentiles.
+"""
+
+import json
+import logging
+import numpy
+
+from redis_locust.stats import round_latency, merge_histograms, latency_summary
+
+# Hash parameters are fixed so sketches built on different workers can be merged by adding them
+_PRIME = (1 << 61) - 1
+_HASH_SEED = 0x5EED
+
+# Tracker of the current test on this process, read by WorkloadEngine
+_tracker = None
+
+# Sketches received from workers, only populated on the process writing the report
+_received = []
+
+def band_of(rank):
+    """
+    Function mapping a rank to its power of two band, 1, 2-3, 4-7, ...
+    """
+
+    return(int(rank).bit_length() - 1)
+
+class CountMinSketch():
+    """
+    Count-min sketch over integer key ranks
+    """
+
+    def __init__(self, width, depth, table=None):
+        self.width = width
+        self.depth = depth
+        hash_random = numpy.random.default_rng(_HASH_SEED)
+        self.a = [int(a) for a in hash_random.integers(1, _PRIME, size=depth)]
+        self.b = [int(b) for b in hash_random.integers(0, _PRIME, size=depth)]
+        self.table = numpy.zeros((depth, width), dtype=numpy.int64) if table is None else table
+
+    def columns(self, rank):
+        return([((a * rank + b) % _PRIME) % self.width for a, b in zip(self.a, self.b)])
+
+    def add(self, rank):
+        """
+        Function to count one access to the rank and return its new estimate
+        """
+
+        estimate = None
+        for row, column in enumerate(self.columns(rank)):
+            self.table[row, column] += 1
+            count = self.table[row, column]
+            if (estimate is None) or (count < estimate):
+                estimate = count
+
+        return(int(estimate))
+
+    def estimate(self, rank):
+        return(int(min(self.table[row, column] for row, column in enumerate(self.columns(rank)))))
+
+    def merge(self, other):
+        self.table += other.table
+
+class HotKeyTracker():
+    """
+    Per worker tracker of the --hotkeys_top hottest key ranks.  Key accesses are counted by the engine, latencies are
+    taken from locust request events of single key requests, per request_type for the tracked ranks and per rank band
+    for all traffic.
+    """
+
+    def __init__(self, environment):
+        self.environment = environment
+        self.options = environment.parsed_options
+        self.sketch = CountMinSketch(self.options.hotkeys_width, self.options.hotkeys_depth)
+        self.top = {}
+        self.min_rank = None
+        self.total = 0
+        self.latencies = {}
+        self.bands = {}
+        self.stopped = False
+
+    def count(self, rank):
+        """
+        Function to count one key access, keeping the top-K ranks by sketch estimate
+        """
+
+        self.total += 1
+        estimate = self.sketch.add(rank)
+        if rank in self.top:
+            self.top[rank] = estimate
+            if rank == self.min_rank:
+                self.min_rank = min(self.top, key=self.top.get)
+        elif len(self.top) < self.options.hotkeys_top:
+            self.top[rank] = estimate
+            if (self.min_rank is None) or (estimate < self.top[self.min_rank]):
+                self.min_rank = rank
+        elif estimate > self.top[self.min_rank]:
+            del self.top[self.min_rank]
+            self.latencies = {key: value for key, value in self.latencies.items() if key[1] != self.min_rank}
+            self.top[rank] = estimate
+            self.min_rank = min(self.top, key=self.top.get)
+
+    def on_request(self, request_type, name, response_time, context=None, **kwargs):
+        """
+        Function listening to locust request events, recording latencies of single key requests
+        """
+
+        if (not context) or (context.get("batch_size", 1) != 1) or ("key_rank" not in context):
+            return
+
+        rank = context["key_rank"]
+        latency = round_latency(response_time)
+        band = self.bands.setdefault((request_type, band_of(rank)), {})
+        band[latency] = band.get(latency, 0) + 1
+        if rank in self.top:
+            stats = self.latencies.setdefault((request_type, rank), {"requests": 0, "jumbo": 0, "response_times": {}})
+            stats["requests"] += 1
+            if name.endswith("_jumbo"):
+                stats["jumbo"] += 1
+            stats["response_times"][latency] = stats["response_times"].get(latency, 0) + 1
+
+    def payload(self):
+        """
+        Function returning the tracker state in a form that can be sent to the master
+        """
+
+        return({
+            "width": self.sketch.width,
+            "depth": self.sketch.depth,
+            "table": self.sketch.table.tolist(),
+            "total": self.total,
+            "top": list(self.top),
+            "latencies": [[request_type, rank, stats["requests"], stats["jumbo"], list(stats["response_times"].items())]
+                for (request_type, rank), stats in self.latencies.items()],
+            "bands": [[request_type, band, list(response_times.items())] for (request_type, band), response_times in self.bands.items()] })
+
+    def on_test_stop(self, **kwargs):
+        global _tracker
+
+        if self.stopped:
+            return
+        self.stopped = True
+        self.environment.events.request.remove_listener(self.on_request)
+        if _tracker is self:
+            _tracker = None
+        self.environment.runner.send_message("hotkeys", self.payload())
+
+def current_tracker():
+    """
+    Function returning the hot key tracker of the running test, or None when tracking is disabled
+    """
+
+    return(_tracker)
+
+def start_hotkey_tracker(environment):
+    """
+    Function to start hot key tracking on a worker when --hotkeys is set
+    """
+
+    global _tracker
+
+    if (environment.parsed_options.hotkeys != "Y"):
+        _tracker = None
+        return(None)
+
+    _tracker = HotKeyTracker(environment)
+    environment.events.request.add_listener(_tracker.on_request)
+    environment.events.test_stop.add_listener(_tracker.on_test_stop)
+
+    return(_tracker)
+
+def hotkey_report(options, payloads):
+    """
+    Function to merge the trackers of all workers into the hot key report
+    """
+
+    sketch = CountMinSketch(payloads[0]["width"], payloads[0]["depth"])
+    for payload in payloads:
+        sketch.merge(CountMinSketch(payload["width"], payload["depth"], numpy.array(payload["table"], dtype=numpy.int64)))
+    total = sum(payload["total"] for payload in payloads)
+
+    candidates = set(rank for payload in payloads for rank in payload["top"])
+    estimates = sorted(((sketch.estimate(rank), rank) for rank in candidates), reverse=True)[:options.hotkeys_top]
+
+    latencies = {}
+    for payload in payloads:
+        for request_type, rank, requests, jumbo, response_times in payload["latencies"]:
+            latencies.setdefault((rank, request_type), []).append((jumbo, response_times))
+
+    keys = []
+    for estimate, rank in estimates:
+        key_int = options.zipf_offset + (rank * options.zipf_direction)
+        targets = {}
+        for (latency_rank, request_type), entries in latencies.items():
+            if latency_rank == rank:
+                targets[request_type] = latency_summary(merge_histograms(response_times for jumbo, response_times in entries))
+                targets[request_type]["jumbo"] = sum(jumbo for jumbo, response_times in entries)
+        keys.append({
+            "rank": rank,
+            "key": ''.join((options.key_name_prefix, str(key_int).zfill(options.key_name_length))),
+            "accesses": estimate,
+            "share": round(estimate / total, 6) if total else 0,
+            "targets": targets })
+
+    bands = {}
+    for payload in payloads:
+        for request_type, band, response_times in payload["bands"]:
+            bands.setdefault((request_type, band), []).append(response_times)
+
+    return({
+        "total_accesses": total,
+        "workers": len(payloads),
+        "keys": keys,
+        "rank_bands": [dict(request_type=request_type, ranks="%d-%d" % (1 << band, (2 << band) - 1), **latency_summary(merge_histograms(histograms)))
+            for (request_type, band), histograms in sorted(bands.items())] })
+
+def register_hotkey_report(environment):
+    """
+    Function to collect the trackers sent by workers and write the merged report each time one arrives, so the report
+    is complete once the last worker has stopped.  Call from an init listener.
+    """
+
+    def on_hotkeys(environment, msg, **kwargs):
+        _received.append(msg.data)
+        report = hotkey_report(environment.parsed_options, _received)
+        with open(environment.parsed_options.hotkeys_report, "w") as f:
+            json.dump(report, f, indent=2)
+        logging.info("Hot key report from %d workers written to %s" % (len(_received), environment.parsed_options.hotkeys_report))
+        for key in report["keys"][:5]:
+            logging.info("Hot key %s (rank %d): %.2f%% of accesses" % (key["key"], key["rank"], key["share"] * 100))
+
+    def on_test_start(**kwargs):
+        del _received[:]
+
+    if environment.runner is not None:
+        environment.runner.register_message("hotkeys", on_hotkeys)
+    environment.events.test_start.add_listener(on_test_start)
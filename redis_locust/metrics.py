@@ -0,0 +1,229 @@
+"""
+OpenMetrics exporter for workers.  Every worker serves its own client side metrics over HTTP: latency histograms,
+request, command and failure counters per (request_type, name), connection pool checkout waits and the CPU time spent
+generating operations.  Metrics are plain counters updated from locust request events on the worker's event loop and
+rendered by a greenlet of the same loop, so no locks are taken and the master is not involved.
+"""
+
+import bisect
+import logging
+import time
+import psutil
+import redis
+from gevent.pywsgi import WSGIServer
+
+from redis_locust.faults import classify_error, current_breakers
+from redis_locust.stats import is_recording
+
+# Upper bounds in seconds of the latency histogram buckets, the last bucket is +Inf
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Exporter of this process, read by WorkloadEngine
+_exporter = None
+
+def escape(value):
+    return(str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+
+def labels(**values):
+    return("{%s}" % ",".join('%s="%s"' % (name, escape(value)) for name, value in values.items()))
+
+class Histogram():
+    """
+    Latency histogram over LATENCY_BUCKETS, counts are kept per bucket and made cumulative when rendered
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+    def render(self, metric, **label_values):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), self.counts):
+            cumulative += count
+            lines.append("%s_bucket%s %d" % (metric, labels(**dict(label_values, le=bound)), cumulative))
+        lines.append("%s_count%s %d" % (metric, labels(**label_values), cumulative))
+        lines.append("%s_sum%s %r" % (metric, labels(**label_values), self.sum))
+
+        return(lines)
+
+class MetricsExporter():
+    """
+    Metrics of one worker process, kept for the life of the process so counters only grow across tests
+    """
+
+    def __init__(self, environment):
+        self.environment = environment
+        self.latencies = {}
+        self.commands = {}
+        self.failures = {}
+        self.checkouts = {}
+        self.generator_seconds = {}
+        self.process = psutil.Process()
+        self.server = None
+
+    def on_request(self, request_type, name, response_time, context=None, exception=None, **kwargs):
+        """
+        Function listening to locust request events, response_time is in microseconds
+        """
+
+        key = (request_type, name)
+        histogram = self.latencies.get(key)
+        if histogram is None:
+            histogram = self.latencies[key] = Histogram()
+        histogram.observe(response_time / 1000000)
+        self.commands[key] = self.commands.get(key, 0) + ((context or {}).get("batch_size", 1))
+        if exception is not None:
+            failure = (request_type, name, classify_error(exception))
+            self.failures[failure] = self.failures.get(failure, 0) + 1
+
+    def observe_checkout(self, endpoint, seconds):
+        histogram = self.checkouts.get(endpoint)
+        if histogram is None:
+            histogram = self.checkouts[endpoint] = Histogram()
+        histogram.observe(seconds)
+
+    def observe_generator(self, kind, seconds):
+        self.generator_seconds[kind] = self.generator_seconds.get(kind, 0) + seconds
+
+    def render(self):
+        """
+        Function returning the metrics in the OpenMetrics text format
+        """
+
+        lines = ["# TYPE redis_locust_request_duration_seconds histogram",
+            "# HELP redis_locust_request_duration_seconds Latency of requests made by locust users"]
+        for (request_type, name), histogram in sorted(self.latencies.items()):
+            lines.extend(histogram.render("redis_locust_request_duration_seconds", request_type=request_type, name=name))
+
+        lines.extend(["# TYPE redis_locust_commands counter",
+            "# HELP redis_locust_commands Commands sent, counting every command of a pipeline or batch"])
+        for (request_type, name), count in sorted(self.commands.items()):
+            lines.append("redis_locust_commands_total%s %d" % (labels(request_type=request_type, name=name), count))
+
+        lines.extend(["# TYPE redis_locust_request_failures counter", "# HELP redis_locust_request_failures Failed requests by error class"])
+        for (request_type, name, error), count in sorted(self.failures.items()):
+            lines.append("redis_locust_request_failures_total%s %d" % (labels(request_type=request_type, name=name, error=error), count))
+
+        lines.extend(["# TYPE redis_locust_pool_checkout_seconds histogram",
+            "# HELP redis_locust_pool_checkout_seconds Time to get a connection from a client connection pool"])
+        for endpoint, histogram in sorted(self.checkouts.items()):
+            lines.extend(histogram.render("redis_locust_pool_checkout_seconds", endpoint=endpoint))
+
+        lines.extend(["# TYPE redis_locust_generator_cpu_seconds counter",
+            "# HELP redis_locust_generator_cpu_seconds CPU time spent building operations"])
+        for kind, seconds in sorted(self.generator_seconds.items()):
+            lines.append("redis_locust_generator_cpu_seconds_total%s %r" % (labels(kind=kind), seconds))
+
+        lines.extend(["# TYPE redis_locust_circuit_open gauge",
+            "# HELP redis_locust_circuit_open Circuit breakers of a target that are open or half-open"])
+        breakers_open = {}
+        for breaker in current_breakers():
+            breakers_open[breaker.request_type] = breakers_open.get(breaker.request_type, 0) + (breaker.state != "closed")
+        for request_type, count in sorted(breakers_open.items()):
+            lines.append("redis_locust_circuit_open%s %d" % (labels(request_type=request_type), count))
+
+        cpu_times = self.process.cpu_times()
+        lines.extend(["# TYPE redis_locust_process_cpu_seconds counter", "# HELP redis_locust_process_cpu_seconds CPU time of the worker process",
+            "redis_locust_process_cpu_seconds_total %r" % (cpu_times.user + cpu_times.system)])
+        lines.extend(["# TYPE redis_locust_users gauge", "# HELP redis_locust_users Users running on the worker",
+            "redis_locust_users %d" % self.environment.runner.user_count, "# EOF"])
+
+        return("\n".join(lines) + "\n")
+
+    def application(self, environ, start_response):
+        start_response("200 OK", [("Content-Type", CONTENT_TYPE)])
+        return([self.render().encode()])
+
+    def serve(self, host, port, tries=100):
+        """
+        Function to serve the metrics on port, or the next free port when several workers share a host
+        """
+
+        for candidate in range(port, port + tries):
+            try:
+                self.server = WSGIServer((host, candidate), self.application, log=None)
+                self.server.start()
+                logging.info("OpenMetrics exporter listening on %s:%d" % (host or "*", candidate))
+                return(candidate)
+            except OSError:
+                continue
+
+        raise OSError("No free port for the OpenMetrics exporter in %d-%d" % (port, port + tries - 1))
+
+def time_checkouts(exporter, pool):
+    """
+    Function to time the connection checkouts of a redis connection pool, checkouts of the warm-up are not timed
+    """
+
+    endpoint = "%s:%s" % (pool.connection_kwargs.get("host"), pool.connection_kwargs.get("port"))
+    get_connection = pool.get_connection
+    if getattr(get_connection, "timed", False):
+        return
+
+    def timed_get_connection(*args, **kwargs):
+        checkout_start = time.perf_counter()
+        try:
+            return(get_connection(*args, **kwargs))
+        finally:
+            if is_recording():
+                exporter.observe_checkout(endpoint, time.perf_counter() - checkout_start)
+
+    timed_get_connection.timed = True
+    pool.get_connection = timed_get_connection
+
+def current_exporter():
+    """
+    Function returning the metrics exporter of this process, or None when --metrics_port is not set
+    """
+
+    return(_exporter)
+
+def start_metrics_exporter(environment):
+    """
+    Function to start serving metrics on a worker or stand-alone process when --metrics_port is set, once per process.
+    Call from an init listener.
+    """
+
+    global _exporter
+
+    if (not environment.parsed_options.metrics_port) or (environment.parsed_options.master):
+        return(None)
+
+    if _exporter is None:
+        _exporter = MetricsExporter(environment)
+        environment.events.request.add_listener(_exporter.on_request)
+        _exporter.serve(environment.parsed_options.metrics_host, environment.parsed_options.metrics_port)
+
+    return(_exporter)
+
+def watch_client(client):
+    """
+    Function to time the pool checkouts of a redis client when the exporter runs, call it when the client is created.
+    After connection errors the cluster client discovers the cluster again and creates new clients, each with its own
+    pool, for the nodes it lost, so the pools of node clients are timed as they are created.
+    """
+
+    if _exporter is None:
+        return
+    if not isinstance(client, redis.cluster.RedisCluster):
+        time_checkouts(_exporter, client.connection_pool)
+        return
+
+    create_redis_node = client.nodes_manager.create_redis_node
+
+    def timed_create_redis_node(*args, **kwargs):
+        node = create_redis_node(*args, **kwargs)
+        time_checkouts(_exporter, node.connection_pool)
+        return(node)
+
+    client.nodes_manager.create_redis_node = timed_create_redis_node
+    for node in client.get_nodes():
+        if node.redis_connection is not None:
+            time_checkouts(_exporter, node.redis_connection.connection_pool)
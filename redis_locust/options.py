@@ -0,0 +1,165 @@
+"""
+Command line options shared by the locustfiles in this repository.
+Each locustfile registers the groups it needs from its own init_command_line_parser listener.
+"""
+
+def add_workload_arguments(parser):
+    """
+    Function to register the options that shape the operation stream produced by WorkloadEngine
+    """
+
+    parser.add_argument("--key_name_prefix", type=str, env_var="RED_LOCUST_KEY_NAME_PREFIX", default="rloc:", help="Prefix for key names")
+    parser.add_argument("--key_name_length", type=int, env_var="RED_LOCUST_KEY_NAME_LENGTH", default=20, help="Length (ie digits) of key name (not including prefix)")
+    parser.add_argument("--number_of_keys", type=int, env_var="RED_LOCUST_NUM_OF_KEYS", default=1000000, help="Number of keys")
+    parser.add_argument("--value_min_chars", type=int, env_var="RED_LOCUST_VALUE_MIN_BYTES", default=15, help="Minimum characters to store in key value")
+    parser.add_argument("--value_max_chars", type=int, env_var="RED_LOCUST_VALUE_MAX_BYTES", default=15, help="Maximum characters to store in key value")
+    parser.add_argument("--zipf_shape", type=float, env_var="RED_LOCUST_ZIPF_SHAPE", default=1.01, help="Zipf shape")
+    parser.add_argument("--zipf_direction", type=int, env_var="RED_LOCUST_ZIPF_DIRECTION", default=1, help="Zipf direction [1|-1]")
+    parser.add_argument("--zipf_max_keys", type=int, env_var="RED_LOCUST_ZIPF_MAX_KEYS", default=10000000, help="Zipf max keys")
+    parser.add_argument("--zipf_offset", type=int, env_var="RED_LOCUST_ZIPF_OFFSET", default=0, help="Zipf Offset")
+    parser.add_argument("--zrem_seconds", type=int, env_var="RED_LOCUST_ZREM_SECONDS", default=300, help="Seconds to keep when trimming the sliding window")
+    parser.add_argument("--pipeline_size", type=int, env_var="RED_LOCUST_PIPELINE_SIZE", default=100, help="Commands per pipeline or batch")
+    parser.add_argument("--zcount_seconds", type=int, env_var="RED_LOCUST_ZCOUNT_SECONDS", default=150, help="Number of seconds to query for counts")
+    parser.add_argument("--jumbo_frequency", type=int, env_var="RED_LOCUST_JUMBO_FREQUENCY", default=50, help="Frequency of jumbo add logic")
+    parser.add_argument("--jumbo_initial_exclude", type=int, env_var="RED_LOCUST_JUMBO_INITIAL_EXCLUDE", default=100, help="Number of initial keys to exclude from jumbo logic")
+    parser.add_argument("--jumbo_size", type=str, env_var="RED_LOCUST_JUMBO_SIZE", default="25,25,50,100,1000", help="Array representing the extra members for jumbo adds")
+    parser.add_argument("--seed", type=int, env_var="RED_LOCUST_SEED", default=0, help="Seed for the operation stream, 0 for unseeded")
+    parser.add_argument("--timeout", type=int, env_var="RED_LOCUST_TIMEOUT", default=500, help="Timeout for Redis in ms, and for DynamoDB with --circuit_breaker or --retry_attempts")
+
+def add_redis_arguments(parser):
+    """
+    Function to register the options for the primary Redis endpoint and how clients connect to it
+    """
+
+    parser.add_argument("--redis_host", type=str, env_var="RED_LOCUST_HOST", default="localhost", help="Host for Redis")
+    parser.add_argument("--redis_port", type=str, env_var="RED_LOCUST_PORT", default="6001", help="Port for Redis")
+    parser.add_argument("--username", type=str, env_var="RED_LOCUST_USERNAME", default="", help="Username for Redis")
+    parser.add_argument("--password", type=str, env_var="RED_LOCUST_PASSWORD", default="", help="Password for Redis")
+    parser.add_argument("--cluster", type=str, env_var="RED_LOCUST_CLUSTER", default="N", help="Cluster mode (Y/N)")
+    parser.add_argument("--tls", type=str, env_var="RED_LOCUST_TLS", default="N", help="TLS (Y/N)")
+    parser.add_argument("--cluster_attribution", type=str, env_var="RED_LOCUST_CLUSTER_ATTRIBUTION", default="N", help="Attribute cluster requests to nodes and count redirections (Y/N)")
+    parser.add_argument("--cluster_report", type=str, env_var="RED_LOCUST_CLUSTER_REPORT", default="cluster-report.json", help="File for the cluster node report")
+
+def add_replica_arguments(parser):
+    """
+    Function to register the options for reading from replicas
+    """
+
+    parser.add_argument("--read_from_replicas", type=str, env_var="RED_LOCUST_READ_FROM_REPLICAS", default="N", help="Send reads to replicas (Y/N)")
+    parser.add_argument("--replica_endpoints", type=str, env_var="RED_LOCUST_REPLICA_ENDPOINTS", default="", help="Comma separated host:port of the replicas of --redis_host, without --cluster")
+    parser.add_argument("--replica_check_every", type=int, env_var="RED_LOCUST_REPLICA_CHECK_EVERY", default=100, help="Compare every Nth single key replica read with the primary, 0 to disable")
+
+def add_dynamodb_arguments(parser):
+    """
+    Function to register the options for the DynamoDB table
+    """
+
+    parser.add_argument("--table_name", type=str, env_var="RED_LOCUST_TABLE_NAME", default="Log", help="DynamoDB table name")
+    parser.add_argument("--local_mode", type=str, env_var="RED_LOCUST_LOCAL_MODE", default="Y", help="Use DynamoDB Local Mode")
+
+def add_sample_arguments(parser):
+    """
+    Function to register the options for raw latency sample capture
+    """
+
+    parser.add_argument("--sample_rate", type=float, env_var="RED_LOCUST_SAMPLE_RATE", default=0, help="Fraction of requests to keep as raw latency samples, 0 to disable")
+    parser.add_argument("--sample_buffer_rows", type=int, env_var="RED_LOCUST_SAMPLE_BUFFER_ROWS", default=1000000, help="Samples held in memory between flushes, bounds sampler memory")
+    parser.add_argument("--sample_flush_seconds", type=int, env_var="RED_LOCUST_SAMPLE_FLUSH_SECONDS", default=10, help="Seconds between sample file flushes")
+    parser.add_argument("--sample_dir", type=str, env_var="RED_LOCUST_SAMPLE_DIR", default="samples", help="Directory for sample files")
+    parser.add_argument("--sample_format", type=str, env_var="RED_LOCUST_SAMPLE_FORMAT", default="npz", help="Sample file format [npz|parquet]")
+
+def add_pipeline_arguments(parser):
+    """
+    Function to register the options for adaptive pipeline / batch sizing
+    """
+
+    parser.add_argument("--pipeline_adaptive", type=str, env_var="RED_LOCUST_PIPELINE_ADAPTIVE", default="N", help="Adapt pipeline size per target and task at runtime (Y/N)")
+    parser.add_argument("--pipeline_min", type=int, env_var="RED_LOCUST_PIPELINE_MIN", default=1, help="Smallest adaptive pipeline size")
+    parser.add_argument("--pipeline_max", type=int, env_var="RED_LOCUST_PIPELINE_MAX", default=1000, help="Largest adaptive pipeline size")
+    parser.add_argument("--pipeline_step", type=int, env_var="RED_LOCUST_PIPELINE_STEP", default=10, help="Additive step of adaptive pipeline size")
+    parser.add_argument("--pipeline_p99_ms", type=float, env_var="RED_LOCUST_PIPELINE_P99_MS", default=50, help="p99 latency SLO in ms for one pipeline")
+    parser.add_argument("--pipeline_interval", type=int, env_var="RED_LOCUST_PIPELINE_INTERVAL", default=5, help="Seconds of observations between pipeline size adjustments")
+
+def add_saturation_arguments(parser):
+    """
+    Function to register the options for the saturation point finder load shape
+    """
+
+    parser.add_argument("--saturation_start_users", type=int, env_var="RED_LOCUST_SATURATION_START_USERS", default=10, help="Users in the first saturation stage")
+    parser.add_argument("--saturation_max_users", type=int, env_var="RED_LOCUST_SATURATION_MAX_USERS", default=1000, help="Most users the saturation search will run")
+    parser.add_argument("--saturation_growth", type=float, env_var="RED_LOCUST_SATURATION_GROWTH", default=2.0, help="Factor to grow users by until a target fails")
+    parser.add_argument("--saturation_resolution", type=int, env_var="RED_LOCUST_SATURATION_RESOLUTION", default=5, help="Users between passing and failing stage at which the knee is found")
+    parser.add_argument("--saturation_spawn_rate", type=float, env_var="RED_LOCUST_SATURATION_SPAWN_RATE", default=50, help="Users started or stopped per second between stages")
+    parser.add_argument("--saturation_stage_seconds", type=int, env_var="RED_LOCUST_SATURATION_STAGE_SECONDS", default=60, help="Length of a saturation stage")
+    parser.add_argument("--saturation_settle_seconds", type=int, env_var="RED_LOCUST_SATURATION_SETTLE_SECONDS", default=15, help="Seconds at the start of a stage excluded from measurement")
+    parser.add_argument("--saturation_p99_ms", type=float, env_var="RED_LOCUST_SATURATION_P99_MS", default=10, help="p99 SLO in ms for every operation")
+    parser.add_argument("--saturation_target_p99_ms", type=str, env_var="RED_LOCUST_SATURATION_TARGET_P99_MS", default="", help="Per request type p99 SLO overrides in ms, eg aa=5,sa-remote=80")
+    parser.add_argument("--saturation_max_error_rate", type=float, env_var="RED_LOCUST_SATURATION_MAX_ERROR_RATE", default=0.01, help="Highest failure ratio for an operation to pass")
+    parser.add_argument("--saturation_report", type=str, env_var="RED_LOCUST_SATURATION_REPORT", default="saturation-report.json", help="File for the saturation summary")
+
+def add_hotkey_arguments(parser):
+    """
+    Function to register the options for hot key tracking
+    """
+
+    parser.add_argument("--hotkeys", type=str, env_var="RED_LOCUST_HOTKEYS", default="N", help="Track hottest keys and their latency (Y/N)")
+    parser.add_argument("--hotkeys_top", type=int, env_var="RED_LOCUST_HOTKEYS_TOP", default=50, help="Number of hottest keys to track")
+    parser.add_argument("--hotkeys_width", type=int, env_var="RED_LOCUST_HOTKEYS_WIDTH", default=4096, help="Width of the count-min sketch")
+    parser.add_argument("--hotkeys_depth", type=int, env_var="RED_LOCUST_HOTKEYS_DEPTH", default=4, help="Depth of the count-min sketch")
+    parser.add_argument("--hotkeys_report", type=str, env_var="RED_LOCUST_HOTKEYS_REPORT", default="hotkeys-report.json", help="File for the hot key report")
+
+def add_warmup_arguments(parser):
+    """
+    Function to register the options for the warm-up phase at test start
+    """
+
+    parser.add_argument("--warmup", type=str, env_var="RED_LOCUST_WARMUP", default="N", help="Fill connection pools and prime targets before users start (Y/N)")
+    parser.add_argument("--warmup_connections", type=int, env_var="RED_LOCUST_WARMUP_CONNECTIONS", default=10, help="Connections opened per pool during warm-up")
+    parser.add_argument("--warmup_operations", type=int, env_var="RED_LOCUST_WARMUP_OPERATIONS", default=100, help="Operations per target in the untimed priming burst")
+
+def add_profile_arguments(parser):
+    """
+    Function to register the options for workload profiles
+    """
+
+    parser.add_argument("--workload_profile", type=str, env_var="RED_LOCUST_WORKLOAD_PROFILE", default="", help="YAML or JSON file with the phases of task weights and workload settings to run")
+
+def add_metrics_arguments(parser):
+    """
+    Function to register the options for the OpenMetrics exporter of workers
+    """
+
+    parser.add_argument("--metrics_port", type=int, env_var="RED_LOCUST_METRICS_PORT", default=0, help="Port for workers to serve OpenMetrics on, the next free port is used when taken, 0 to disable")
+    parser.add_argument("--metrics_host", type=str, env_var="RED_LOCUST_METRICS_HOST", default="", help="Address for the OpenMetrics exporter to listen on, all interfaces when empty")
+
+def add_region_arguments(parser):
+    """
+    Function to register the options for coordinated two-region runs, used on the masters
+    """
+
+    parser.add_argument("--region", type=str, env_var="RED_LOCUST_REGION", default="", help="Name of this region in a coordinated two-region run, empty to run alone")
+    parser.add_argument("--region_role", type=str, env_var="RED_LOCUST_REGION_ROLE", default="coordinator", help="Role of this region [coordinator|follower]")
+    parser.add_argument("--region_coordinator", type=str, env_var="RED_LOCUST_REGION_COORDINATOR", default="localhost:5580", help="host:port of the coordinator region's master, for the follower")
+    parser.add_argument("--region_host", type=str, env_var="RED_LOCUST_REGION_HOST", default="", help="Address the coordinator listens on, all interfaces when empty")
+    parser.add_argument("--region_port", type=int, env_var="RED_LOCUST_REGION_PORT", default=5580, help="Port the coordinator listens on")
+    parser.add_argument("--region_pings", type=int, env_var="RED_LOCUST_REGION_PINGS", default=8, help="Pings used to estimate the clock offset to the coordinator")
+    parser.add_argument("--region_start_delay", type=float, env_var="RED_LOCUST_REGION_START_DELAY", default=5, help="Seconds between both regions passing the start barrier and their users starting")
+    parser.add_argument("--region_barrier_timeout", type=int, env_var="RED_LOCUST_REGION_BARRIER_TIMEOUT", default=300, help="Seconds to wait for the other region at the start barrier and for the follower's timeline")
+    parser.add_argument("--region_interval", type=float, env_var="RED_LOCUST_REGION_INTERVAL", default=5, help="Seconds between timeline samples")
+    parser.add_argument("--region_report", type=str, env_var="RED_LOCUST_REGION_REPORT", default="region-timeline.json", help="File for the timeline, merged over both regions on the coordinator")
+
+def add_fault_arguments(parser):
+    """
+    Function to register the options for per target circuit breakers and retries of failed calls
+    """
+
+    parser.add_argument("--circuit_breaker", type=str, env_var="RED_LOCUST_CIRCUIT_BREAKER", default="N", help="Stop sending calls to a failing target for a while [Y|N]")
+    parser.add_argument("--breaker_window", type=int, env_var="RED_LOCUST_BREAKER_WINDOW", default=100, help="Latest calls of a target the error rate is taken over")
+    parser.add_argument("--breaker_min_calls", type=int, env_var="RED_LOCUST_BREAKER_MIN_CALLS", default=20, help="Calls needed in the window before the error rate can open the breaker")
+    parser.add_argument("--breaker_error_rate", type=float, env_var="RED_LOCUST_BREAKER_ERROR_RATE", default=0.5, help="Failure ratio in the window that opens the breaker")
+    parser.add_argument("--breaker_timeouts", type=int, env_var="RED_LOCUST_BREAKER_TIMEOUTS", default=3, help="Timeouts in a row that open the breaker")
+    parser.add_argument("--breaker_open_seconds", type=float, env_var="RED_LOCUST_BREAKER_OPEN_SECONDS", default=10, help="Seconds an open breaker refuses calls before letting a probe call through")
+    parser.add_argument("--retry_attempts", type=int, env_var="RED_LOCUST_RETRY_ATTEMPTS", default=0, help="Retries of a call failing with a timeout, connection, throttle or redirection error, 0 to disable")
+    parser.add_argument("--retry_backoff_ms", type=float, env_var="RED_LOCUST_RETRY_BACKOFF_MS", default=20, help="Base of the exponential backoff between retries in ms, with full jitter")
+    parser.add_argument("--retry_backoff_max_ms", type=float, env_var="RED_LOCUST_RETRY_BACKOFF_MAX_MS", default=500, help="Longest backoff between retries in ms")
+    parser.add_argument("--faults_report", type=str, env_var="RED_LOCUST_FAULTS_REPORT", default="faults-report.json", help="File for the errors, retries and circuit breaker activity per target")
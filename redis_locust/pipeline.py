@@ -0,0 +1,155 @@
+"""
+Adaptive pipeline sizing.  Each backend gets one controller per batch operation kind, which moves the number of
+commands sent per pipeline / batch between --pipeline_min and --pipeline_max based on observed throughput and p99.
+"""
+
+import json
+import logging
+import time
+import numpy
+
+BATCH_KINDS = ("add_batch", "count_batch")
+
+# Controllers of the current test on this process, keyed by "<request_type>/<kind>"
+_controllers = {}
+
+# Latest pipeline sizes reported by each worker, only populated on the master
+_worker_sizes = {}
+
+class PipelineController():
+    """
+    Hill-climbing AIMD controller for one (target, operation kind).  Observations are collected for
+    --pipeline_interval seconds, after which the size is halved if p99 exceeded --pipeline_p99_ms or requests failed,
+    otherwise it keeps stepping in the direction that last improved throughput (commands per second).
+    """
+
+    def __init__(self, size, minimum, maximum, step, p99_ms, interval):
+        self.size = size
+        self.minimum = minimum
+        self.maximum = maximum
+        self.step = step
+        self.p99_ms = p99_ms
+        self.interval = interval
+        self.direction = 1
+        self.last_throughput = None
+        self.throughput = 0
+        self.p99 = 0
+        self.reset_interval()
+
+    def reset_interval(self):
+        self.interval_start = time.perf_counter()
+        self.latencies = []
+        self.commands = 0
+        self.failures = 0
+
+    def observe(self, commands, latency_seconds, failed):
+        """
+        Function to record one pipeline / batch call, adjusting the size at the end of each interval
+        """
+
+        self.latencies.append(latency_seconds)
+        self.commands += commands
+        if failed:
+            self.failures += 1
+
+        elapsed = time.perf_counter() - self.interval_start
+        if elapsed >= self.interval:
+            self.adjust(elapsed)
+            self.reset_interval()
+
+    def adjust(self, elapsed):
+        self.throughput = self.commands / elapsed
+        self.p99 = float(numpy.percentile(self.latencies, 99)) * 1000
+
+        if self.failures or (self.p99 > self.p99_ms):
+            self.size = int(self.size / 2)
+            self.direction = 1
+        else:
+            if (self.last_throughput is not None) and (self.throughput < self.last_throughput):
+                self.direction = -self.direction
+            self.size += self.direction * self.step
+
+        self.size = min(self.maximum, max(self.minimum, self.size))
+        self.last_throughput = self.throughput
+
+    def report(self):
+        return({"size": self.size, "throughput": round(self.throughput, 1), "p99_ms": round(self.p99, 3)})
+
+def enable_adaptive_pipelines(options, backends):
+    """
+    Function to attach a controller per batch operation kind to every backend when --pipeline_adaptive is set.
+    Controllers start at --pipeline_size, clamped to the configured bounds.
+    """
+
+    _controllers.clear()
+    if (options.pipeline_adaptive != "Y"):
+        return
+
+    initial = min(options.pipeline_max, max(options.pipeline_min, options.pipeline_size))
+    for backend in backends:
+        for kind in BATCH_KINDS:
+            if (kind == "count_batch") and not backend.reads:
+                continue
+            controller = PipelineController(initial, options.pipeline_min, options.pipeline_max, options.pipeline_step,
+                options.pipeline_p99_ms, options.pipeline_interval)
+            backend.pipeline_controllers[kind] = controller
+            _controllers["%s/%s" % (backend.request_type, kind)] = controller
+
+def current_pipeline_sizes():
+    """
+    Function returning the pipeline sizes chosen on this process
+    """
+
+    return({name: controller.report() for name, controller in _controllers.items()})
+
+def pipeline_size_summary():
+    """
+    Function returning the chosen pipeline sizes of the whole test, aggregated over workers when run distributed
+    """
+
+    if not _worker_sizes:
+        return(current_pipeline_sizes())
+
+    summary = {}
+    for sizes in _worker_sizes.values():
+        for name, report in sizes.items():
+            summary.setdefault(name, []).append(report)
+
+    return({name: {
+        "workers": len(reports),
+        "size_min": min(report["size"] for report in reports),
+        "size_mean": round(sum(report["size"] for report in reports) / len(reports), 1),
+        "size_max": max(report["size"] for report in reports),
+        "throughput": round(sum(report["throughput"] for report in reports), 1) }
+        for name, reports in summary.items()})
+
+def register_pipeline_stats(environment):
+    """
+    Function to publish the chosen pipeline sizes: workers add them to their stats reports, the master keeps the latest
+    report of each worker, and the web UI serves the summary on /pipeline_sizes.  Call from an init listener.
+    """
+
+    def on_report_to_master(client_id, data):
+        data["pipeline_sizes"] = current_pipeline_sizes()
+
+    def on_worker_report(client_id, data):
+        if "pipeline_sizes" in data:
+            _worker_sizes[client_id] = data["pipeline_sizes"]
+
+    def on_test_start(**kwargs):
+        _worker_sizes.clear()
+
+    def on_test_stop(**kwargs):
+        summary = pipeline_size_summary()
+        if summary:
+            logging.info("Adaptive pipeline sizes: %s" % json.dumps(summary, sort_keys=True))
+
+    environment.events.report_to_master.add_listener(on_report_to_master)
+    environment.events.worker_report.add_listener(on_worker_report)
+    environment.events.test_start.add_listener(on_test_start)
+    environment.events.test_stop.add_listener(on_test_stop)
+
+    if environment.web_ui:
+        @environment.web_ui.app.route("/pipeline_sizes")
+        def pipeline_sizes():
+            return(pipeline_size_summary())
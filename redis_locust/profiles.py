@@ -0,0 +1,230 @@
+"""
+Workload profiles.  A profile file (YAML or JSON) describes a timeline of phases, each with its own task weights per
+operation kind and workload settings, eg a steady 80/20 read/write mix, then a jumbo write storm, then recovery.
+Workers switch phases at runtime by reweighting the tasks of their user classes and setting the workload settings
+WorkloadEngine reads before the options, and pick up edits of the file without a restart.  ProfileShape follows the user counts of the
+phases on the master.
+"""
+
+import json
+import logging
+import os
+import time
+import gevent
+from locust import LoadTestShape
+
+from redis_locust.engine import OPERATION_KINDS, set_profile_settings
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Options a profile or phase may set, all read by WorkloadEngine for every operation through WorkloadEngine.setting
+PROFILE_SETTINGS = ("pipeline_size", "zcount_seconds", "zrem_seconds", "jumbo_frequency", "jumbo_initial_exclude", "jumbo_size", "zipf_shape")
+
+def validate_section(section, where):
+    """
+    Function to check the weights and settings of the profile or of one of its phases, a jumbo_size list is joined
+    into the comma separated form of --jumbo_size
+    """
+
+    for kind, weight in section.get("weights", {}).items():
+        if kind not in OPERATION_KINDS:
+            raise ValueError("Unknown operation kind %s in %s weights" % (kind, where))
+        if (not isinstance(weight, int)) or (weight < 0):
+            raise ValueError("Weight of %s in %s must be a non negative integer" % (kind, where))
+    if ("weights" in section) and not sum(section["weights"].values()):
+        raise ValueError("Weights of %s are all zero" % where)
+    settings = section.get("settings", {})
+    if isinstance(settings.get("jumbo_size"), list):
+        settings["jumbo_size"] = ",".join(str(size) for size in settings["jumbo_size"])
+    for name in settings:
+        if name not in PROFILE_SETTINGS:
+            raise ValueError("Setting %s in %s can not be changed by a profile, use one of %s" % (name, where, ", ".join(PROFILE_SETTINGS)))
+
+def load_profile(path):
+    """
+    Function to read and validate a profile file, JSON when its name ends in .json and YAML otherwise
+    """
+
+    with open(path) as f:
+        if path.endswith(".json"):
+            profile = json.load(f)
+        elif yaml is None:
+            raise ValueError("YAML workload profiles require PyYAML to be installed")
+        else:
+            profile = yaml.safe_load(f)
+
+    if (not isinstance(profile, dict)) or (not profile.get("phases")):
+        raise ValueError("Workload profile %s has no phases" % path)
+    validate_section(profile, "profile")
+    for index, phase in enumerate(profile["phases"]):
+        phase.setdefault("name", "phase %d" % (index + 1))
+        if phase.get("seconds", 0) <= 0:
+            raise ValueError("Phase %s needs a positive number of seconds" % phase["name"])
+        validate_section(phase, phase["name"])
+
+    return(profile)
+
+def phase_at(profile, elapsed):
+    """
+    Function returning the index of the phase running elapsed seconds into the profile, or None once a profile that
+    does not loop has finished
+    """
+
+    if profile.get("loop"):
+        elapsed %= sum(phase["seconds"] for phase in profile["phases"])
+    for index, phase in enumerate(profile["phases"]):
+        if elapsed < phase["seconds"]:
+            return(index)
+        elapsed -= phase["seconds"]
+
+    return(None)
+
+class WorkloadProfile():
+    """
+    Timeline of a profile on one worker.  Every second a greenlet checks the file for edits and the clock for the next
+    phase.  Applying a phase replaces the tasks list of each user class, which locust picks the next task from, so
+    running users follow the new mix from their next task.  Tasks are matched to operation kinds by the task_kinds
+    mapping of the user class, or by their name.  Once a profile that does not loop has finished, its last phase
+    stays applied.  The timeline starts when the profile is started, at the beginning of test start on the worker, like
+    the run time of ProfileShape on the master.
+    """
+
+    def __init__(self, environment):
+        self.environment = environment
+        self.path = environment.parsed_options.workload_profile
+        self.base_tasks = {user_class: list(user_class.tasks) for user_class in environment.user_classes}
+        self.profile = load_profile(self.path)
+        self.mtime = os.path.getmtime(self.path)
+        self.phase = None
+        self.start = time.time()
+        self.greenlet = None
+        self.stopped = False
+
+    def reload(self):
+        """
+        Function to read the profile again when the file was changed, keeping the current one if it is not valid
+        """
+
+        mtime = os.path.getmtime(self.path)
+        if mtime == self.mtime:
+            return
+        self.mtime = mtime
+        try:
+            self.profile = load_profile(self.path)
+            self.phase = None
+            logging.info("Workload profile %s reloaded" % self.path)
+        except Exception as e:
+            logging.warning("Workload profile %s not reloaded: %s" % (self.path, e))
+
+    def weighted_tasks(self, user_class, weights):
+        """
+        Function to build the tasks list of a user class with each task repeated by the weight of its operation kind
+        """
+
+        tasks = []
+        kinds = getattr(user_class, "task_kinds", {})
+        for task in dict.fromkeys(self.base_tasks[user_class]):
+            tasks.extend([task] * weights.get(kinds.get(task.__name__, task.__name__), 0))
+        if not tasks:
+            logging.warning("No task of %s has a weight in the workload profile, keeping its own weights" % user_class.__name__)
+            return(list(self.base_tasks[user_class]))
+
+        return(tasks)
+
+    def apply(self, index):
+        phase = self.profile["phases"][index]
+        settings = dict(self.profile.get("settings", {}))
+        settings.update(phase.get("settings", {}))
+        set_profile_settings(settings)
+
+        weights = phase.get("weights", self.profile.get("weights"))
+        for user_class in self.base_tasks:
+            user_class.tasks = self.weighted_tasks(user_class, weights) if weights else list(self.base_tasks[user_class])
+
+        self.phase = index
+        logging.info("Workload profile phase %s for %d seconds, weights %s, settings %s" % (phase["name"], phase["seconds"],
+            json.dumps(weights, sort_keys=True), json.dumps(phase.get("settings", {}), sort_keys=True)))
+
+    def loop(self):
+        while not self.stopped:
+            self.reload()
+            index = phase_at(self.profile, time.time() - self.start)
+            if index is None:
+                index = len(self.profile["phases"]) - 1
+            if index != self.phase:
+                self.apply(index)
+            gevent.sleep(1)
+
+    def on_test_stop(self, **kwargs):
+        """
+        Function to stop the timeline and go back to the task weights and options given on the command line
+        """
+
+        if self.stopped:
+            return
+        self.stopped = True
+        if self.greenlet is not None:
+            self.greenlet.kill(block=False)
+        for user_class, tasks in self.base_tasks.items():
+            user_class.tasks = tasks
+        set_profile_settings({})
+
+def start_workload_profile(environment):
+    """
+    Function to start following --workload_profile on a worker, the first phase is applied before returning.  Call it
+    first in the test start listener, before connecting and warming up, so the phases line up with ProfileShape.
+    """
+
+    if not environment.parsed_options.workload_profile:
+        return(None)
+
+    myProfile = WorkloadProfile(environment)
+    myProfile.apply(phase_at(myProfile.profile, 0))
+    myProfile.greenlet = gevent.spawn(myProfile.loop)
+    environment.events.test_stop.add_listener(myProfile.on_test_stop)
+
+    return(myProfile)
+
+class ProfileShape(LoadTestShape):
+    """
+    Load shape running the users and spawn_rate of each phase of --workload_profile, set per phase or for the whole
+    profile.  The test stops at the end of a profile that does not loop.  Like the workers, the shape reads the file
+    again when it was changed, keeping the current profile if it is not valid.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.profile = None
+        self.mtime = None
+
+    def reload(self):
+        path = self.runner.environment.parsed_options.workload_profile
+        mtime = os.path.getmtime(path)
+        if mtime == self.mtime:
+            return
+        self.mtime = mtime
+        if self.profile is None:
+            self.profile = load_profile(path)
+            return
+        try:
+            self.profile = load_profile(path)
+            logging.info("Workload profile %s reloaded by the load shape" % path)
+        except Exception as e:
+            logging.warning("Workload profile %s not reloaded by the load shape: %s" % (path, e))
+
+    def tick(self):
+        self.reload()
+
+        index = phase_at(self.profile, self.get_run_time())
+        if index is None:
+            return(None)
+
+        phase = self.profile["phases"][index]
+        users = phase.get("users", self.profile.get("users"))
+        if users is None:
+            raise ValueError("Phase %s of the workload profile has no users" % phase["name"])
+
+        return(users, phase.get("spawn_rate", self.profile.get("spawn_rate", users)))
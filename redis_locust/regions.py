@@ -0,0 +1,317 @@
+"""
+Coordinated two-region runs.  The masters of two regions run the same locustfile, one as coordinator and one as
+follower.  At test start the follower estimates the offset of its clock to the coordinator's with an NTP-style ping
+exchange, and both masters wait on a start barrier so their users start at the same instant.  Workers start from
+the offset of their master and then estimate their own against the coordinator, as they may run on other hosts,
+so transaction times and sliding windows use the coordinator's clock.  Each master samples its stats per
+target into an offset-corrected timeline, and the follower sends its timeline to the coordinator at test stop, which
+writes the merged cross-region timeline.
+"""
+
+import json
+import logging
+import time
+import gevent
+import requests
+from gevent.pywsgi import WSGIServer
+from locust.runners import WorkerRunner
+from locust.stats import calculate_response_time_percentile, diff_response_time_dicts
+
+# Offset in seconds from this process's clock to the coordinator's clock
+_offset = 0.0
+
+# Region of the current test on this master
+_region = None
+
+def region_time():
+    """
+    Function returning the current time on the coordinator's clock, or the local time outside of coordinated runs
+    """
+
+    return(time.time() + _offset)
+
+def set_offset(offset):
+    global _offset
+    _offset = offset
+
+def estimate_offset(url, pings):
+    """
+    Function to estimate the offset to the clock served on url.  Each ping takes the local time t0 before the request,
+    the remote time t1 and the local time t2 after it, giving offset t1 - (t0 + t2) / 2 with an error of at most half
+    the round trip.  The ping with the shortest round trip is kept.
+    """
+
+    samples = []
+    for i in range(pings):
+        t0 = time.time()
+        t1 = requests.get(url + "/clock", timeout=10).json()["time"]
+        t2 = time.time()
+        samples.append((t2 - t0, t1 - (t0 + t2) / 2))
+
+    delay, offset = min(samples)
+    return(offset, delay)
+
+def snapshot(stats):
+    """
+    Function to add up the cumulative counters and response times of the stats entries per request_type
+    """
+
+    totals = {}
+    for (name, request_type), entry in stats.entries.items():
+        num_requests, num_failures, response_times = totals.get(request_type, (0, 0, {}))
+        response_times = dict(response_times)
+        for latency, count in entry.response_times.items():
+            response_times[latency] = response_times.get(latency, 0) + count
+        totals[request_type] = (num_requests + entry.num_requests, num_failures + entry.num_failures, response_times)
+
+    return(totals)
+
+def coordinator_url(options):
+    """
+    Function returning the URL of the coordinator's clock as seen from a worker.  Workers of the coordinator region
+    reach it on the host of their master.
+    """
+
+    if (options.region_role == "follower"):
+        return("http://%s" % options.region_coordinator)
+
+    return("http://%s:%d" % (options.master_host, options.region_port))
+
+def estimate_worker_offset(options):
+    """
+    Function to estimate the offset of a worker's own clock to the coordinator's, keeping the current offset when the
+    coordinator can not be reached
+    """
+
+    try:
+        offset, delay = estimate_offset(coordinator_url(options), options.region_pings)
+    except Exception as e:
+        logging.warning("Worker clock offset to coordinator not estimated, keeping %.6f seconds: %s" % (_offset, e))
+        return
+
+    set_offset(offset)
+    logging.info("Worker clock offset to coordinator %.6f seconds, round trip %.6f seconds" % (offset, delay))
+
+class Region():
+    """
+    One region of a coordinated run, on its master.  Samples the stats of every --region_interval into timeline rows
+    with offset-corrected times.
+    """
+
+    def __init__(self, environment):
+        self.environment = environment
+        self.options = environment.parsed_options
+        self.name = self.options.region
+        self.offset = 0.0
+        self.delay = 0.0
+        self.start_at = None
+        self.rows = []
+        self.sampler = None
+        self.stopped = False
+
+    def wait_until(self, start_at):
+        """
+        Function to sleep until start_at on the coordinator's clock, the start barrier itself
+        """
+
+        self.start_at = start_at
+        gevent.sleep(max(0, start_at - region_time()))
+        logging.info("Region %s starting at %.3f on the coordinator's clock, offset %.6f seconds" % (self.name, start_at, self.offset))
+
+    def sample(self):
+        last = snapshot(self.environment.runner.stats)
+        last_time = region_time()
+        while not self.stopped:
+            gevent.sleep(self.options.region_interval)
+            current = snapshot(self.environment.runner.stats)
+            current_time = region_time()
+            for request_type, (num_requests, num_failures, response_times) in sorted(current.items()):
+                last_requests, last_failures, last_response_times = last.get(request_type, (0, 0, {}))
+                interval_requests = num_requests - last_requests
+                interval_times = diff_response_time_dicts(response_times, last_response_times)
+                self.rows.append({
+                    "region": self.name,
+                    "time": round(current_time, 3),
+                    "elapsed": round(current_time - self.start_at, 3),
+                    "request_type": request_type,
+                    "requests": interval_requests,
+                    "failures": num_failures - last_failures,
+                    "throughput": round(interval_requests / (current_time - last_time), 1),
+                    "p50_us": calculate_response_time_percentile(interval_times, interval_requests, 0.5),
+                    "p99_us": calculate_response_time_percentile(interval_times, interval_requests, 0.99) })
+            last, last_time = current, current_time
+
+    def start(self):
+        set_offset(self.offset)
+        self.environment.runner.send_message("region_offset", self.offset)
+        self.sampler = gevent.spawn(self.sample)
+
+    def stop(self):
+        self.stopped = True
+        if self.sampler is not None:
+            self.sampler.kill(block=False)
+
+    def payload(self):
+        return({"region": self.name, "offset": self.offset, "delay": self.delay, "start_at": self.start_at, "rows": self.rows})
+
+class Coordinator(Region):
+    """
+    Region whose clock the run follows.  Serves its clock, the start barrier and the collection of the follower's
+    timeline on --region_port.
+    """
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        self.follower = None
+        self.received = None
+        self.server = WSGIServer((self.options.region_host, self.options.region_port), self.application, log=None)
+        self.server.start()
+
+    def application(self, environ, start_response):
+        path = environ["PATH_INFO"]
+        body = json.loads(environ["wsgi.input"].read() or "null")
+        if path == "/clock":
+            response = {"time": time.time()}
+        elif path == "/ready":
+            self.follower = body["region"]
+            self.start_at = None
+            response = {"region": self.name}
+        elif path == "/barrier":
+            response = {"start_at": self.start_at if self.follower else None}
+        elif path == "/timeline":
+            self.received = body
+            self.write_report()
+            response = {"rows": len(body["rows"])}
+        else:
+            start_response("404 Not Found", [("Content-Type", "application/json")])
+            return([b"{}"])
+
+        start_response("200 OK", [("Content-Type", "application/json")])
+        return([json.dumps(response).encode()])
+
+    def barrier(self):
+        """
+        Function to wait for the follower to be ready, then publish a start time --region_start_delay seconds ahead
+        """
+
+        deadline = time.time() + self.options.region_barrier_timeout
+        while self.follower is None:
+            if time.time() > deadline:
+                raise TimeoutError("No follower region reached the start barrier in %d seconds" % self.options.region_barrier_timeout)
+            gevent.sleep(0.1)
+
+        self.start_at = time.time() + self.options.region_start_delay
+        self.wait_until(self.start_at)
+
+    def wait_for_follower(self):
+        """
+        Function to give the follower up to --region_barrier_timeout seconds to send its timeline at test stop
+        """
+
+        deadline = time.time() + self.options.region_barrier_timeout
+        while (self.received is None) and (time.time() < deadline):
+            gevent.sleep(0.5)
+        if self.received is None:
+            logging.warning("No timeline received from follower region %s" % self.follower)
+
+    def write_report(self):
+        """
+        Function to merge the timelines of both regions, ordered by their offset-corrected time
+        """
+
+        regions = [self.payload()] + ([self.received] if self.received else [])
+        report = {
+            "start_at": self.start_at,
+            "regions": {region["region"]: {"offset_seconds": region["offset"], "round_trip_seconds": region["delay"]} for region in regions},
+            "timeline": sorted((row for region in regions for row in region["rows"]), key=lambda row: (row["time"], row["region"], row["request_type"])) }
+        with open(self.options.region_report, "w") as f:
+            json.dump(report, f, indent=2)
+        logging.info("Merged timeline of regions %s written to %s" % (", ".join(sorted(report["regions"])), self.options.region_report))
+
+class Follower(Region):
+    """
+    Region following the coordinator at --region_coordinator, its timeline is kept on the coordinator's clock
+    """
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        self.url = "http://%s" % self.options.region_coordinator
+
+    def barrier(self):
+        self.offset, self.delay = estimate_offset(self.url, self.options.region_pings)
+        logging.info("Region %s clock offset to coordinator %.6f seconds, round trip %.6f seconds" % (self.name, self.offset, self.delay))
+        set_offset(self.offset)
+        requests.post(self.url + "/ready", json={"region": self.name}, timeout=10)
+
+        deadline = time.time() + self.options.region_barrier_timeout
+        while True:
+            start_at = requests.get(self.url + "/barrier", timeout=10).json()["start_at"]
+            if start_at is not None:
+                break
+            if time.time() > deadline:
+                raise TimeoutError("Coordinator region did not open the start barrier in %d seconds" % self.options.region_barrier_timeout)
+            gevent.sleep(0.1)
+
+        self.wait_until(start_at)
+
+    def write_report(self):
+        with open(self.options.region_report, "w") as f:
+            json.dump(self.payload(), f, indent=2)
+        try:
+            requests.post(self.url + "/timeline", json=self.payload(), timeout=30)
+        except requests.RequestException as e:
+            logging.warning("Timeline not sent to coordinator region: %s" % e)
+
+def register_region(environment):
+    """
+    Function to take part in a coordinated two-region run when --region is set.  On the master the test start waits on
+    the start barrier and the test stop merges the timelines.  Workers take the clock offset of their master, sent
+    before users are spawned, then estimate their own at every test start, which also covers workers joining late.
+    Call from an init listener.
+    """
+
+    global _region
+
+    def on_region_offset(environment, msg, **kwargs):
+        set_offset(msg.data)
+
+    def on_worker_test_start(environment, **kwargs):
+        # Workers get the options of the master with the first spawn message, before their test start
+        if environment.parsed_options.region:
+            gevent.spawn(estimate_worker_offset, environment.parsed_options)
+
+    def on_test_start(environment, **kwargs):
+        _region.stopped = False
+        _region.rows = []
+        _region.barrier()
+        _region.start()
+
+    def on_test_stop(environment, **kwargs):
+        if _region.stopped:
+            return
+        _region.stop()
+        if isinstance(_region, Coordinator):
+            _region.wait_for_follower()
+        _region.write_report()
+        if isinstance(_region, Coordinator):
+            _region.follower = None
+            _region.received = None
+
+    if isinstance(environment.runner, WorkerRunner):
+        environment.runner.register_message("region_offset", on_region_offset)
+        environment.events.test_start.add_listener(on_worker_test_start)
+        return
+
+    if not environment.parsed_options.region:
+        return
+
+    if environment.runner is not None:
+        environment.runner.register_message("region_offset", on_region_offset)
+    if (environment.parsed_options.region_role == "coordinator"):
+        _region = Coordinator(environment)
+    elif (environment.parsed_options.region_role == "follower"):
+        _region = Follower(environment)
+    else:
+        raise ValueError("Unknown region role: %s" % environment.parsed_options.region_role)
+    environment.events.test_start.add_listener(on_test_start)
+    environment.events.test_stop.add_listener(on_test_stop)
@@ -0,0 +1,185 @@
+"""
+Raw latency sample capture.  Sampled requests are written into pre-allocated numpy ring buffers on the hot path and a
+background greenlet periodically flushes them to chunked columnar files (npz, or Parquet when pyarrow is installed).
+"""
+
+import itertools
+import logging
+import os
+import random
+import socket
+import time
+import gevent
+import numpy
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from redis_locust.regions import region_time
+
+SAMPLE_COLUMNS = ("timestamp", "request_type", "name", "latency_us", "batch_size", "key_rank", "failed")
+
+# Numbers the tests recorded by this process, so a later test never writes over the chunks of an earlier one
+_test_numbers = itertools.count(1)
+
+class SampleRecorder():
+    """
+    Keeps a sampled copy of individual requests.  Memory is bounded by --sample_buffer_rows; if more rows arrive
+    between two flushes than the buffer holds, the oldest unflushed rows are overwritten and counted as dropped.
+    Recording never yields to gevent, so the buffers need no locking between users and the flush greenlet.
+    """
+
+    def __init__(self, environment):
+        self.environment = environment
+        self.options = environment.parsed_options
+        self.rate = self.options.sample_rate
+        self.capacity = self.options.sample_buffer_rows
+        self.random = random.Random()
+
+        self.timestamp = numpy.zeros(self.capacity, dtype=numpy.float64)
+        self.request_type = numpy.zeros(self.capacity, dtype=numpy.int16)
+        self.name = numpy.zeros(self.capacity, dtype=numpy.int16)
+        self.latency_us = numpy.zeros(self.capacity, dtype=numpy.float32)
+        self.batch_size = numpy.zeros(self.capacity, dtype=numpy.int32)
+        self.key_rank = numpy.zeros(self.capacity, dtype=numpy.int64)
+        self.failed = numpy.zeros(self.capacity, dtype=numpy.bool_)
+
+        self.request_types = {}
+        self.names = {}
+        self.written = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.chunk = 0
+        self.greenlet = None
+        self.running = False
+
+        # Chunks of each test get their own prefix, with the time the test started and its number on the process
+        worker_index = getattr(environment.runner, "worker_index", 0)
+        self.file_prefix = os.path.join(self.options.sample_dir, "samples-%s-%d-%d-%s-%d" % (socket.gethostname(), worker_index,
+            os.getpid(), time.strftime("%Y%m%d%H%M%S"), next(_test_numbers)))
+
+    def on_request(self, request_type, name, response_time, exception=None, context=None, **kwargs):
+        """
+        Function listening to locust request events, keeping roughly --sample_rate of them
+        """
+
+        if self.random.random() >= self.rate:
+            return
+
+        i = self.written % self.capacity
+        self.timestamp[i] = region_time()
+        self.request_type[i] = self.request_types.setdefault(request_type, len(self.request_types))
+        self.name[i] = self.names.setdefault(name, len(self.names))
+        self.latency_us[i] = response_time
+        self.batch_size[i] = context.get("batch_size", 1) if context else 1
+        self.key_rank[i] = context.get("key_rank", 0) if context else 0
+        self.failed[i] = exception is not None
+        self.written += 1
+
+    def take(self):
+        """
+        Function to copy the rows written since the last flush out of the ring buffers
+        """
+
+        pending = self.written - self.flushed
+        if pending > self.capacity:
+            self.dropped += pending - self.capacity
+            self.flushed = self.written - self.capacity
+            pending = self.capacity
+        if pending == 0:
+            return(None)
+
+        index = numpy.arange(self.flushed, self.written) % self.capacity
+        self.flushed = self.written
+
+        return({
+            "timestamp": self.timestamp[index],
+            "request_type": self.request_type[index],
+            "name": self.name[index],
+            "latency_us": self.latency_us[index],
+            "batch_size": self.batch_size[index],
+            "key_rank": self.key_rank[index],
+            "failed": self.failed[index] })
+
+    def write_chunk(self, columns, filename, request_types, names):
+        """
+        Function to write one chunk of samples to disk.  Runs on the gevent thread pool so compression does not block users.
+        """
+
+        if self.options.sample_format == "parquet":
+            arrays = dict(columns)
+            arrays["request_type"] = pyarrow.DictionaryArray.from_arrays(columns["request_type"], request_types)
+            arrays["name"] = pyarrow.DictionaryArray.from_arrays(columns["name"], names)
+            pyarrow.parquet.write_table(pyarrow.table([arrays[column] for column in SAMPLE_COLUMNS], names=list(SAMPLE_COLUMNS)), filename)
+        else:
+            numpy.savez_compressed(filename, request_type_labels=request_types, name_labels=names, **columns)
+
+    def flush(self):
+        """
+        Function to flush pending samples into the next chunk file
+        """
+
+        columns = self.take()
+        if columns is None:
+            return
+
+        extension = "parquet" if self.options.sample_format == "parquet" else "npz"
+        filename = "%s-%05d.%s" % (self.file_prefix, self.chunk, extension)
+        self.chunk += 1
+        request_types = numpy.array(sorted(self.request_types, key=self.request_types.get))
+        names = numpy.array(sorted(self.names, key=self.names.get))
+
+        gevent.get_hub().threadpool.spawn(self.write_chunk, columns, filename, request_types, names).get()
+        logging.debug("Wrote %d latency samples to %s" % (len(columns["timestamp"]), filename))
+
+    def flush_loop(self):
+        while True:
+            gevent.sleep(self.options.sample_flush_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error("Failed to flush latency samples: %s" % e)
+
+    def start(self):
+        """
+        Function to attach the recorder to locust request events and start the flush greenlet
+        """
+
+        os.makedirs(self.options.sample_dir, exist_ok=True)
+        self.environment.events.request.add_listener(self.on_request)
+        self.environment.events.test_stop.add_listener(self.stop)
+        self.greenlet = gevent.spawn(self.flush_loop)
+        self.running = True
+
+    def stop(self, **kwargs):
+        """
+        Function to detach from request events and write out the remaining samples
+        """
+
+        if not self.running:
+            return
+        self.running = False
+        self.environment.events.request.remove_listener(self.on_request)
+        self.greenlet.kill()
+        self.flush()
+        if self.dropped:
+            logging.warning("Latency sample buffer overflowed, %d samples dropped; raise --sample_buffer_rows or lower --sample_rate" % self.dropped)
+
+def start_sample_recorder(environment):
+    """
+    Function to start raw latency sample capture on a worker when --sample_rate is set.
+    Returns the recorder, or None when sampling is disabled.
+    """
+
+    if environment.parsed_options.sample_rate <= 0:
+        return(None)
+    if (environment.parsed_options.sample_format == "parquet") and (pyarrow is None):
+        raise ValueError("--sample_format parquet requires pyarrow to be installed")
+
+    recorder = SampleRecorder(environment)
+    recorder.start()
+
+    return(recorder)
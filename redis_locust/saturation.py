@@ -0,0 +1,198 @@
+"""
+Saturation point finder.  SaturationShape steps the user count up, checks every stage's p99 and error rate per
+request_type against SLOs, and binary searches the knee of each target.  A summary of the maximum sustainable
+throughput per target and operation is written when the search finishes.
+"""
+
+import json
+import logging
+import time
+from locust import LoadTestShape
+from locust.stats import calculate_response_time_percentile, diff_response_time_dicts
+
+# Names recorded for calls that were refused by a circuit breaker or for replica staleness findings, not commands
+# sent to the target, so they do not take part in the SLO checks
+SYNTHETIC_NAMES = ("circuit_open", "zcount_staleness")
+
+class StageResult():
+    """
+    Statistics of one (request_type, name) over the measured part of a stage
+    """
+
+    def __init__(self, users, num_requests, num_failures, response_times, seconds):
+        self.users = users
+        self.num_requests = num_requests
+        self.num_failures = num_failures
+        self.throughput = num_requests / seconds if seconds else 0
+        self.error_rate = num_failures / num_requests if num_requests else 0
+        self.p99 = calculate_response_time_percentile(response_times, num_requests, 0.99)
+
+    def report(self):
+        return({"users": self.users, "throughput": round(self.throughput, 1), "p99_us": self.p99, "error_rate": round(self.error_rate, 4)})
+
+class SaturationShape(LoadTestShape):
+    """
+    Load shape searching for the highest user count each target sustains within its SLO.
+
+    Each stage runs for --saturation_stage_seconds, of which the first --saturation_settle_seconds are not measured.
+    The user count grows by --saturation_growth until a target fails its SLO, then the interval between the last
+    passing and first failing count is halved until it is narrower than --saturation_resolution users.  The failing
+    targets get their knee recorded and the search continues upwards for the remaining targets, until every target has
+    a knee or --saturation_max_users is reached.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.options = None
+
+    def setup(self):
+        self.options = self.runner.environment.parsed_options
+        self.target_p99 = {}
+        for setting in filter(None, self.options.saturation_target_p99_ms.split(',')):
+            target, p99 = setting.split('=')
+            self.target_p99[target.strip()] = float(p99) * 1000
+
+        self.lower = 0
+        self.upper = None
+        self.upper_failing = set()
+        self.users = max(1, self.options.saturation_start_users)
+        self.open_targets = None
+        self.last_passing = {}
+        self.knees = {}
+        self.stages = []
+        self.start_stage()
+
+    def start_stage(self):
+        self.stage_start = self.get_run_time()
+        self.snapshot = None
+
+    def take_snapshot(self):
+        """
+        Function to copy the cumulative counters of every stats entry at the start of the measured window
+        """
+
+        self.snapshot_time = time.time()
+        self.snapshot = {key: (entry.num_requests, entry.num_failures, dict(entry.response_times))
+            for key, entry in self.runner.stats.entries.items()}
+
+    def stage_results(self):
+        """
+        Function to build the results of the measured window from the difference to the snapshot
+        """
+
+        seconds = time.time() - self.snapshot_time
+        results = {}
+        for key, entry in self.runner.stats.entries.items():
+            num_requests, num_failures, response_times = self.snapshot.get(key, (0, 0, {}))
+            if entry.num_requests - num_requests <= 0:
+                continue
+            results[key] = StageResult(self.users, entry.num_requests - num_requests, entry.num_failures - num_failures,
+                diff_response_time_dicts(entry.response_times, response_times), seconds)
+
+        return(results)
+
+    def failing_targets(self, results):
+        """
+        Function returning the request types with any operation outside its p99 or error rate SLO
+        """
+
+        failing = set()
+        for (name, request_type), result in results.items():
+            if name in SYNTHETIC_NAMES:
+                continue
+            p99_limit = self.target_p99.get(request_type, self.options.saturation_p99_ms * 1000)
+            if (result.p99 > p99_limit) or (result.error_rate > self.options.saturation_max_error_rate):
+                failing.add(request_type)
+
+        return(failing)
+
+    def record_knees(self, targets, first_failing_users):
+        """
+        Function to close the search for targets, keeping their best passing stage as the maximum sustainable throughput
+        """
+
+        for target in targets:
+            operations = {name: result.report() for (name, request_type), result in self.last_passing.items() if request_type == target}
+            self.knees[target] = {
+                "knee_users": max([result["users"] for result in operations.values()] or [0]),
+                "first_failing_users": first_failing_users,
+                "operations": operations }
+        self.open_targets -= targets
+
+    def finish_stage(self):
+        """
+        Function to evaluate the stage just measured and choose the user count of the next one.
+        Returns False when the search is finished.
+        """
+
+        results = self.stage_results()
+        if not results:
+            logging.warning("Saturation stage with %d users recorded no requests, repeating it" % self.users)
+            self.start_stage()
+            return(True)
+        if self.open_targets is None:
+            self.open_targets = {request_type for (name, request_type) in results if name not in SYNTHETIC_NAMES}
+        failing = self.failing_targets(results) & self.open_targets
+        self.stages.append({"users": self.users, "failing": sorted(failing),
+            "results": {"%s %s" % (request_type, name): result.report() for (name, request_type), result in results.items()}})
+        logging.info("Saturation stage with %d users, failing targets: %s" % (self.users, ", ".join(sorted(failing)) or "none"))
+
+        # Keep the highest passing stage of every target, also from stages where another target failed
+        for key, result in results.items():
+            if (key[0] not in SYNTHETIC_NAMES) and (key[1] in self.open_targets) and (key[1] not in failing):
+                if (key not in self.last_passing) or (self.last_passing[key].users <= result.users):
+                    self.last_passing[key] = result
+
+        if failing:
+            self.upper = self.users
+            self.upper_failing = failing
+        else:
+            self.lower = self.users
+
+        # A resolution below one user would bisect forever between two neighbouring user counts
+        if (self.upper is not None) and (self.upper - self.lower <= max(1, self.options.saturation_resolution)):
+            # Knee found for the targets failing at the upper bound, the others passed there so keep climbing
+            self.record_knees(self.upper_failing, self.upper)
+            self.lower = self.upper
+            self.upper = None
+
+        if not self.open_targets:
+            return(False)
+        if self.upper is None:
+            if self.lower >= self.options.saturation_max_users:
+                self.record_knees(set(self.open_targets), None)
+                return(False)
+            self.users = min(self.options.saturation_max_users, max(self.lower + 1, int(self.lower * self.options.saturation_growth)))
+        else:
+            self.users = max(1, (self.lower + self.upper) // 2)
+
+        self.start_stage()
+        return(True)
+
+    def tick(self):
+        if self.options is None:
+            self.setup()
+
+        stage_time = self.get_run_time() - self.stage_start
+        if (self.snapshot is None) and (stage_time >= self.options.saturation_settle_seconds):
+            self.take_snapshot()
+        if stage_time >= self.options.saturation_stage_seconds:
+            if not self.finish_stage():
+                self.write_report()
+                return(None)
+
+        return(self.users, self.options.saturation_spawn_rate)
+
+    def write_report(self):
+        """
+        Function to write the saturation summary as JSON and log the knee of every target
+        """
+
+        report = {"targets": self.knees, "stages": self.stages}
+        with open(self.options.saturation_report, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+        for target, knee in sorted(self.knees.items()):
+            for name, result in sorted(knee["operations"].items()):
+                logging.info("Saturation %s %s: %.1f req/s at %d users, p99 %d us" % (target, name, result["throughput"], result["users"], result["p99_us"]))
+        logging.info("Saturation report written to %s" % self.options.saturation_report)
@@ -0,0 +1,71 @@
+"""
+Reporting of requests made directly against data stores into locust statistics.
+"""
+
+from locust import events
+from locust.stats import calculate_response_time_percentile
+
+# Cleared while warm-up traffic runs, so it is not reported to locust
+_recording = True
+
+def set_recording(recording):
+    global _recording
+    _recording = recording
+
+def is_recording():
+    return(_recording)
+
+def record_request_meta(request_type, name, start_time, end_time, response_length, response, exception, context=None):
+    """
+    Function to record locust request, based on standard locust request meta data
+    Response time is calculated from the time.perf_counter() inputs and is expressed in microseconds
+    """
+
+    if not _recording:
+        return
+
+    events.request.fire(
+        request_type = request_type,
+        name = name,
+        start_time = start_time,
+        response_time = (end_time - start_time) * 1000 * 1000,
+        response_length = response_length,
+        response = response,
+        context = context or {},
+        exception = exception)
+
+def round_latency(latency):
+    """
+    Function to round a latency to two significant digits, like locust does for its response time histograms
+    """
+
+    latency = int(latency)
+    if latency < 100:
+        return(latency)
+    elif latency < 1000:
+        return(int(round(latency, -1)))
+    elif latency < 10000:
+        return(int(round(latency, -2)))
+    else:
+        return(int(round(latency, -3)))
+
+def merge_histograms(histograms):
+    """
+    Function to add up response time histograms given as (latency, count) pairs, as sent between workers and master
+    """
+
+    merged = {}
+    for response_times in histograms:
+        for latency, count in response_times:
+            merged[latency] = merged.get(latency, 0) + count
+
+    return(merged)
+
+def latency_summary(response_times):
+    requests = sum(response_times.values())
+    return({
+        "requests": requests,
+        "p50_us": calculate_response_time_percentile(response_times, requests, 0.5),
+        "p95_us": calculate_response_time_percentile(response_times, requests, 0.95),
+        "p99_us": calculate_response_time_percentile(response_times, requests, 0.99),
+        "max_us": max(response_times) if response_times else 0 })
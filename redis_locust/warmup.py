@@ -0,0 +1,138 @@
+"""
+Warm-up phase run on workers at test start, before any user is spawned.  The clients of all targets are created
+concurrently, then each target gets its connection pools filled and a short burst of operations that is not reported
+to locust, so connection set-up, TLS handshakes and cluster slot discovery are kept out of the measured latencies.
+The time taken by each step is sent to the master and reported on its own.
+
+The warm-up runs inside test_start, and locust starts the --run-time timer with the test, so the warm-up counts
+against the run time.  The time it took is logged next to the run time so short runs can be made longer.
+"""
+
+import itertools
+import json
+import logging
+import time
+import gevent
+
+from redis_locust.engine import OPERATION_KINDS, WorkloadEngine
+from redis_locust.stats import set_recording
+
+# Latest warm-up timings of each worker, only populated on the process writing the report
+_received = {}
+
+class WarmUp():
+    """
+    Warm-up of the targets of one worker.  connect() is always concurrent, run() fills pools and primes the targets
+    when --warmup is set and sends the timings of both to the master.
+    """
+
+    def __init__(self, environment):
+        self.environment = environment
+        self.options = environment.parsed_options
+        self.timings = {"connect": {}, "prefill": {}, "prime": {}}
+        self.failed = {}
+        self.start = time.perf_counter()
+
+    def timed(self, step, name, function, *args):
+        """
+        Function to call function and keep how long it took as the step timing of name
+        """
+
+        step_start = time.perf_counter()
+        try:
+            return(function(*args))
+        finally:
+            self.timings[step][name] = round(time.perf_counter() - step_start, 3)
+
+    def connect(self, connectors):
+        """
+        Function to create the clients of connectors, a dict of name to client factory, concurrently.
+        Returns the clients by name, connection errors are raised as they would be without the warm-up.
+        """
+
+        greenlets = {name: gevent.spawn(self.timed, "connect", name, connector) for name, connector in connectors.items()}
+        gevent.joinall(list(greenlets.values()), raise_error=True)
+
+        return({name: greenlet.value for name, greenlet in greenlets.items()})
+
+    def prime(self, backend):
+        """
+        Function to run --warmup_operations operations against one backend, cycling through the operation kinds
+        """
+
+        myEngine = WorkloadEngine(self.environment, warmup=True)
+        for kind in itertools.islice(itertools.cycle(OPERATION_KINDS), self.options.warmup_operations):
+            myEngine.run(kind, [backend])
+
+    def warm(self, backend):
+        """
+        Function to fill the pools of one backend and prime it, a failed step is reported and ends its warm-up
+        """
+
+        for step, function, args in (("prefill", backend.prefill, (self.options.warmup_connections,)), ("prime", self.prime, (backend,))):
+            try:
+                self.timed(step, backend.request_type, function, *args)
+            except Exception as e:
+                self.failed[backend.request_type] = "%s: %s" % (step, e)
+                logging.warning("Warm-up of %s failed in %s: %s" % (backend.request_type, step, e))
+                return
+
+    def run(self, backends):
+        """
+        Function to warm up every backend concurrently with requests kept out of locust stats, then report the timings
+        """
+
+        if (self.options.warmup == "Y"):
+            set_recording(False)
+            try:
+                gevent.joinall([gevent.spawn(self.warm, backend) for backend in backends])
+            finally:
+                set_recording(True)
+
+        report = dict(self.timings, failed=self.failed, seconds=round(time.perf_counter() - self.start, 3))
+        logging.info("Warm-up took %.3f seconds%s: %s" % (report["seconds"],
+            " of the %d second run time" % self.options.run_time if self.options.run_time else "", json.dumps(self.timings, sort_keys=True)))
+        self.environment.runner.send_message("warmup", report)
+
+        return(report)
+
+def warmup_summary():
+    """
+    Function returning the warm-up timings of the test, with the slowest worker for each step and target
+    """
+
+    summary = {"workers": len(_received), "seconds_max": max([report["seconds"] for report in _received.values()] or [0]), "failed": {}}
+    for report in _received.values():
+        summary["failed"].update(report.get("failed", {}))
+        for step in ("connect", "prefill", "prime"):
+            slowest = summary.setdefault(step, {})
+            for name, seconds in report[step].items():
+                slowest[name] = max(seconds, slowest.get(name, 0))
+
+    return(summary)
+
+def register_warmup_report(environment):
+    """
+    Function to collect the warm-up timings sent by workers, log them and serve the summary on /warmup.  Timings are
+    kept per worker and replaced by its next warm-up, as workers may warm up before the master has seen test_start.
+    Call from an init listener.
+    """
+
+    def on_warmup(environment, msg, **kwargs):
+        _received[msg.node_id] = msg.data
+        logging.info("Warm-up of %s took %.3f seconds" % (msg.node_id, msg.data["seconds"]))
+        for name, error in sorted(msg.data.get("failed", {}).items()):
+            logging.warning("Warm-up of %s on %s failed in %s" % (name, msg.node_id, error))
+
+    def on_test_stop(**kwargs):
+        if _received:
+            logging.info("Warm-up timings: %s" % json.dumps(warmup_summary(), sort_keys=True))
+
+    if environment.runner is not None:
+        environment.runner.register_message("warmup", on_warmup)
+    environment.events.test_stop.add_listener(on_test_stop)
+
+    if environment.web_ui:
+        @environment.web_ui.app.route("/warmup")
+        def warmup():
+            return(warmup_summary())
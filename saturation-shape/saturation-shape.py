@@ -0,0 +1,16 @@
+"""
+Load shape finding the maximum sustainable throughput of every target.  Add it after the locustfile under test, eg
+locust -f sorted-sets-aa-vs-sa/sorted-sets-aa-vs-sa.py,saturation-shape/saturation-shape.py
+"""
+
+from locust import events
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from redis_locust import SaturationShape, add_saturation_arguments
+
+@events.init_command_line_parser.add_listener
+def _(parser):
+    add_saturation_arguments(parser)